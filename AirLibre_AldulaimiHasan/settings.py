@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compression gzip/brotli des réponses texte ; avant tout middleware qui lit le contenu
+    'activities.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,8 +66,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [str(BASE_DIR.joinpath('templates'))],  # Nous utilisons les templates dans les applications uniquement
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Indentation et commentaires HTML retirés une fois par template (activities/template_loaders.py)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'activities.template_loaders.FilesystemLoader',
+                    'activities.template_loaders.AppDirectoriesLoader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -82,12 +90,60 @@ WSGI_APPLICATION = 'AirLibre_AldulaimiHasan.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Profil choisi par la variable d'environnement DB_ENGINE :
+# - 'sqlite' (par défaut) : WAL, synchronous=NORMAL, mmap et délai d'attente des verrous,
+#   appliqués à chaque ouverture de connexion ; DB_SQLITE_TUNED=0 revient aux réglages par défaut
+# - 'postgres' : connexions persistantes avec vérification, ou pool (DB_POOL=1, psycopg 3)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# Durée de vie des connexions persistantes (en secondes, 0 = une connexion par requête)
+CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'airlibre'),
+            'USER': os.getenv('DB_USER', 'airlibre'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if os.getenv('DB_POOL') == '1':
+        # Le pool de psycopg remplace les connexions persistantes (CONN_MAX_AGE doit valoir 0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv('DB_SQLITE_TUNED', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # Les écrivains ne bloquent plus les lecteurs, et inversement
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA busy_timeout=5000;'
+            ),
+            # Prendre le verrou d'écriture dès le début des transactions (évite les erreurs « database is locked »)
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        }
 
 
 
@@ -134,6 +190,17 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Fichiers statiques : noms empreintés par le contenu et variantes gzip/brotli écrites par
+# collectstatic (brotli n'est utilisé que si le paquet « brotli » est installé)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'activities.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -150,8 +217,122 @@ LOGIN_REDIRECT_URL = '/'
 
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
+# Limitation des connexions échouées (activities/services/login_throttle.py)
+# - LOGIN_MAX_FAILURES_PER_ACCOUNT : échecs tolérés pour un même nom d'utilisateur
+# - LOGIN_MAX_FAILURES_PER_IP : échecs tolérés pour une même adresse IP, tous comptes confondus
+# - LOGIN_THROTTLE_WINDOW : durée (en secondes) de la fenêtre, à partir du premier échec
+LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.getenv('LOGIN_MAX_FAILURES_PER_ACCOUNT', 5))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 20))
+LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', 900))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
+
+# Documents d'activité (stockage adressé par contenu, voir activities/storage.py) :
+# délai (en heures) avant que gc_documents supprime un contenu qui n'est plus référencé
+DOCUMENT_GC_GRACE_HOURS = int(os.getenv('DOCUMENT_GC_GRACE_HOURS', 24))
+
+# Service des fichiers téléversés (activities/media.py)
+# - MEDIA_SENDFILE_BACKEND : '' (Django diffuse le fichier), 'xsendfile' (Apache, lighttpd)
+#   ou 'nginx' (X-Accel-Redirect vers MEDIA_ACCEL_REDIRECT_PREFIX, emplacement « internal »
+#   dont l'alias pointe sur MEDIA_ROOT)
+MEDIA_SENDFILE_BACKEND = os.getenv('MEDIA_SENDFILE_BACKEND', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Cache
+# - CACHE_REDIS_URL (ex. redis://localhost:6379/1) : cache Redis partagé par tous les processus.
+#   Obligatoire dès que l'application tourne dans plusieurs processus ou sur plusieurs serveurs :
+#   les invalidations déclenchées par les signaux (catégories, cartes d'activité, pages en cache)
+#   ne vident que le cache du processus qui a reçu le signal.
+# - sans cette variable : cache en mémoire locale, propre à chaque processus (développement,
+#   processus unique). Les durées de cache des données invalidées par signaux sont alors
+#   courtes par défaut (voir CACHE_IS_SHARED) pour borner le temps où un processus sert une
+#   donnée périmée.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+CACHE_IS_SHARED = bool(CACHE_REDIS_URL)
+
+if CACHE_IS_SHARED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'airlibre',
+        }
+    }
+
+# Durée de cache (en secondes) du registre des catégories (invalidé par les signaux de Category)
+CATEGORY_REGISTRY_TIMEOUT = int(os.getenv('CATEGORY_REGISTRY_TIMEOUT', 3600 if CACHE_IS_SHARED else 60))
+
+# Cache de la qualité de l'air (en secondes)
+# - AQI_CACHE_TIMEOUT : durée pendant laquelle une lecture est considérée fraîche
+# - AQI_CACHE_STALE_TIMEOUT : durée supplémentaire pendant laquelle une lecture périmée est servie
+#   pendant son rafraîchissement en arrière-plan
+# - AQI_CACHE_NEGATIVE_TIMEOUT : durée de mémorisation d'une ville inconnue
+AQI_CACHE_TIMEOUT = int(os.getenv('AQI_CACHE_TIMEOUT', 900))
+AQI_CACHE_STALE_TIMEOUT = int(os.getenv('AQI_CACHE_STALE_TIMEOUT', 3600))
+AQI_CACHE_NEGATIVE_TIMEOUT = int(os.getenv('AQI_CACHE_NEGATIVE_TIMEOUT', 120))
+
+# Client HTTP de l'API de qualité de l'air
+# - délais de connexion et de lecture (en secondes)
+# - disjoncteur : après AQI_CIRCUIT_FAILURE_THRESHOLD échecs consécutifs,
+#   l'API n'est plus appelée pendant AQI_CIRCUIT_COOLDOWN secondes
+AQI_CONNECT_TIMEOUT = float(os.getenv('AQI_CONNECT_TIMEOUT', 2))
+AQI_READ_TIMEOUT = float(os.getenv('AQI_READ_TIMEOUT', 5))
+AQI_POOL_SIZE = int(os.getenv('AQI_POOL_SIZE', 4))
+AQI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AQI_CIRCUIT_FAILURE_THRESHOLD', 5))
+AQI_CIRCUIT_COOLDOWN = float(os.getenv('AQI_CIRCUIT_COOLDOWN', 30))
+
+# Préchauffage du cache de qualité de l'air (commande prewarm_aqi)
+# - AQI_PREWARM_INTERVAL : délai entre deux passes en mode boucle (en secondes)
+# - AQI_PREWARM_WORKERS : nombre maximal de requêtes simultanées vers l'API
+# - AQI_PREWARM_MAX_CITIES : nombre maximal de villes rafraîchies par passe
+AQI_PREWARM_INTERVAL = int(os.getenv('AQI_PREWARM_INTERVAL', 600))
+AQI_PREWARM_WORKERS = int(os.getenv('AQI_PREWARM_WORKERS', 4))
+AQI_PREWARM_MAX_CITIES = int(os.getenv('AQI_PREWARM_MAX_CITIES', 100))
+
+# Badges de qualité de l'air des pages de liste
+# - AQI_BADGE_DEADLINE : délai global (en secondes) avant d'afficher « en attente »
+# - AQI_BADGE_WORKERS : nombre de recherches simultanées
+AQI_BADGE_DEADLINE = float(os.getenv('AQI_BADGE_DEADLINE', 1.5))
+AQI_BADGE_WORKERS = int(os.getenv('AQI_BADGE_WORKERS', 8))
+
+# Nombre d'activités par page dans la liste des activités
+ACTIVITIES_PER_PAGE = int(os.getenv('ACTIVITIES_PER_PAGE', 12))
+
+# Flux d'abonnement .ics / .csv
+# - FEED_PAST_DAYS : nombre de jours d'activités passées conservées dans les flux
+# - FEED_UID_DOMAIN : domaine des identifiants (UID) des événements iCalendar
+FEED_PAST_DAYS = int(os.getenv('FEED_PAST_DAYS', 30))
+FEED_UID_DOMAIN = os.getenv('FEED_UID_DOMAIN', 'airlibre.local')
+
+# Taille maximale d'une page de l'API JSON (paramètre limit)
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+
+# Nombre maximal de résultats (triés par pertinence) pour une recherche plein texte
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+
+# Durée de cache (en secondes) des comptes par catégorie et par ville de la liste des activités
+FACET_CACHE_TIMEOUT = int(os.getenv('FACET_CACHE_TIMEOUT', 60))
+
+# Durée de cache (en secondes) du rendu des cartes d'activité ; les cartes sont
+# invalidées dès qu'une activité, sa catégorie ou son organisateur change (dans tous les
+# processus avec un cache partagé, dans le processus qui a reçu le signal sinon)
+ACTIVITY_CARD_CACHE_TIMEOUT = int(os.getenv('ACTIVITY_CARD_CACHE_TIMEOUT', 3600 if CACHE_IS_SHARED else 60))
+
+# Durée de cache (en secondes) des pages publiques (accueil, liste) servies aux visiteurs anonymes
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 30))
+
+# Nombre maximal d'activités listées dans chaque section de la page de profil
+PROFILE_ACTIVITIES_LIMIT = int(os.getenv('PROFILE_ACTIVITIES_LIMIT', 50))
+
+# Nombre de participants affichés par page sur la page de détail d'une activité
+ATTENDEES_PER_PAGE = int(os.getenv('ATTENDEES_PER_PAGE', 50))
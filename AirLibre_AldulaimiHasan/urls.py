@@ -15,9 +15,9 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+import activities.media
 import activities.views
-from django.conf.urls.static import static
 from django.conf import settings
 
 
@@ -27,7 +27,11 @@ urlpatterns = [
     path('activities/', include('activities.urls')),
     path('accounts/login/', activities.views.Login_view, name='login'),  # Surcharge la vue login
     path('accounts/', include('django.contrib.auth.urls')),
-    path('accounts/register/', activities.views.signup_view, name='signup')
+    path('accounts/register/', activities.views.signup_view, name='signup'),
+    # Fichiers téléversés, avec contrôle d'accès (voir activities/media.py)
+    re_path(r'^{}(?P<name>.+)$'.format(settings.MEDIA_URL.lstrip('/')), activities.media.serve_media, name='media'),
+    # Fichiers statiques empreintés et précompressés (voir activities/storage.py)
+    re_path(r'^{}(?P<name>.+)$'.format(settings.STATIC_URL.lstrip('/')), activities.media.serve_static, name='static'),
 ]
 
 # Gestionnaires d'erreurs personnalisés
@@ -35,6 +39,3 @@ handler400 = 'activities.views.render_400_error'
 handler403 = 'activities.views.render_403_error'
 handler404 = 'activities.views.render_404_error'
 handler500 = 'activities.views.render_500_error'
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Activity, Category, User
+from .models import Activity, Category, DocumentBlob, User, WaitlistEntry
+from .services import reservations
+from .services.search import is_supported, search_activities
 
 # Register your models here.
 
@@ -16,13 +18,39 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 class ActivityAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'location_city', 'start_time', 'end_time', 'proposer', 'category')
+    list_display = ('id', 'title', 'location_city', 'start_time', 'end_time', 'proposer', 'category', 'capacity', 'reserved_count')
     list_filter = ('category', 'start_time', 'location_city')
     search_fields = ('title', 'description', 'location_city')
     filter_horizontal = ('attendees',)
     date_hierarchy = 'start_time'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Recherche par l'index plein texte plutôt que par icontains sur chaque colonne
+        if not search_term.strip() or not is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        return search_activities(queryset, search_term, ranked=False), False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Les participants modifiés dans l'admin ne passent pas par le service de réservation :
+        # recalculer le compteur, puis donner les places libérées à la liste d'attente
+        form.instance.sync_reserved_count()
+        reservations.promote_waitlist(form.instance.pk)
+
+
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'activity', 'user', 'created_at')
+    list_select_related = ('activity', 'user')
+
+
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'size', 'created_at', 'last_used_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'created_at', 'last_used_at')
+
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Activity, ActivityAdmin)
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(WaitlistEntry, WaitlistEntryAdmin)
+admin.site.register(DocumentBlob, DocumentBlobAdmin)
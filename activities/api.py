@@ -0,0 +1,164 @@
+"""
+API JSON en lecture seule (version 1) : liste, filtres et détail des activités.
+
+    GET /activities/api/v1/activities/             liste paginée par curseur (after / before / limit)
+    GET /activities/api/v1/activities/?stream=1    export complet, diffusé en continu
+    GET /activities/api/v1/activities/<id>/        détail d'une activité
+
+Les filtres sont ceux de la liste HTML (q, category, city, when, date_from, date_to).
+Le paramètre fields (ex. fields=id,title,start_time) limite les champs renvoyés.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from .froms import ArticleSearchForm
+from .models import Activity
+from .pagination import InvalidCursor, paginate_keyset
+from .services.facets import filter_date_range
+from .services.search import search_activities
+
+
+# Champs disponibles : nom -> fonction d'extraction
+FIELDS = {
+    'id': lambda activity: activity.pk,
+    'title': lambda activity: activity.title,
+    'description': lambda activity: activity.description,
+    'location_city': lambda activity: activity.location_city,
+    'start_time': lambda activity: activity.start_time,
+    'end_time': lambda activity: activity.end_time,
+    'category': lambda activity: activity.category.name if activity.category else None,
+    'proposer': lambda activity: activity.proposer.username,
+    'capacity': lambda activity: activity.capacity,
+    'places_left': lambda activity: activity.places_left,
+    'attendee_count': lambda activity: activity.attendee_count,
+    'updated_at': lambda activity: activity.updated_at,
+}
+
+# Taille des lots lus par le curseur lors d'un export en continu
+STREAM_CHUNK_SIZE = 2000
+
+
+def _error(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def _parse_fields(request):
+    """Retourne la liste des champs demandés ; lève ValueError si un champ est inconnu"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Champs inconnus : {', '.join(unknown)}")
+    return fields
+
+
+def _queryset_for(fields):
+    """Ne charge que ce que les champs demandés utilisent"""
+    # pylint: disable=no-member
+    queryset = Activity.objects.all()
+    if 'attendee_count' in fields:
+        queryset = queryset.for_cards()
+    else:
+        related = [name for name in ('category', 'proposer') if name in fields]
+        if related:
+            queryset = queryset.select_related(*related)
+    if 'description' not in fields:
+        queryset = queryset.defer('description')
+    return queryset
+
+
+def serialize(activity, fields):
+    return {name: FIELDS[name](activity) for name in fields}
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def _stream(queryset, fields):
+    """Encode le tableau JSON élément par élément : la mémoire reste constante quelle que soit la taille"""
+    yield '['
+    for index, activity in enumerate(queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)):
+        yield (',' if index else '') + _dumps(serialize(activity, fields))
+    yield ']'
+
+
+@require_GET
+def activity_list(request):
+    try:
+        fields = _parse_fields(request)
+    except ValueError as e:
+        return _error(str(e), available=list(FIELDS))
+
+    form = ArticleSearchForm(request.GET)
+    if not form.is_valid():
+        return _error("Filtres invalides", errors=form.errors.get_json_data())
+    filters = form.cleaned_data
+
+    activities = _queryset_for(fields)
+    if request.GET.get('scope', 'upcoming') != 'all':
+        activities = activities.upcoming()
+    activities = filter_date_range(activities, filters['when'], filters['date_from'], filters['date_to'])
+    if filters['category']:
+        activities = activities.filter(category__name__in=filters['category'])
+    if filters['city']:
+        activities = activities.filter(location_city__in=filters['city'])
+    query = filters['q'].strip()
+    if query:
+        # Pas de tri par pertinence : la pagination par curseur suppose un tri par date
+        activities = search_activities(activities, query, ranked=False)
+
+    if request.GET.get('stream') == '1':
+        response = StreamingHttpResponse(
+            _stream(activities.order_by('start_time', 'id'), fields),
+            content_type='application/json; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'inline; filename="activities.json"'
+        return response
+
+    try:
+        limit = min(max(int(request.GET.get('limit', settings.ACTIVITIES_PER_PAGE)), 1), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        return _error("Le paramètre limit doit être un entier")
+
+    try:
+        page = paginate_keyset(activities, limit, after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor as e:
+        return _error(str(e))
+
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+
+    def page_url(direction, cursor):
+        if cursor is None:
+            return None
+        page_params = params.copy()
+        page_params[direction] = cursor
+        return request.build_absolute_uri(f"{reverse('api_activity_list')}?{page_params.urlencode()}")
+
+    return JsonResponse({
+        'results': [serialize(activity, fields) for activity in page],
+        'next': page_url('after', page.next_cursor),
+        'previous': page_url('before', page.previous_cursor),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+def activity_detail(request, activity_id):
+    try:
+        fields = _parse_fields(request)
+    except ValueError as e:
+        return _error(str(e), available=list(FIELDS))
+
+    activity = _queryset_for(fields).filter(pk=activity_id).first()
+    if activity is None:
+        return _error("Cette activité n'existe pas", status=404)
+    return JsonResponse(serialize(activity, fields), json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,42 @@
+import hashlib
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def compute_etag(request, *parts):
+    """
+    Calcule un ETag faible pour une page à partir de ce qu'elle affiche.
+    L'utilisateur connecté et le jeton CSRF en font partie : une page personnalisée
+    (boutons d'inscription, formulaires) ne peut pas être resservie à quelqu'un d'autre.
+    """
+    key = repr((
+        request.user.pk if request.user.is_authenticated else None,
+        request.META.get('CSRF_COOKIE'),
+        request.get_full_path(),
+        parts,
+    ))
+    return 'W/"{}"'.format(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def conditional_render(request, etag, last_modified, render_page):
+    """
+    Répond 304 Not Modified si la copie du client est à jour, sinon rend la page avec render_page().
+    Les pages qui ont des messages en attente sont toujours rendues pour les afficher.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = None
+    if not len(messages.get_messages(request)):
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render_page()
+
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Le navigateur doit revalider à chaque fois ; les caches partagés ne doivent pas conserver la page
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,179 @@
+"""
+Flux d'abonnement aux activités pour les applications de calendrier (.ics) et les tableurs (.csv).
+
+    /activities/feeds/<jeton>/mine.ics       activités proposées par l'utilisateur du jeton
+    /activities/feeds/<jeton>/inscrit.ics    activités auxquelles il est inscrit
+    /activities/feeds/category/<id>.ics      calendrier public d'une catégorie
+
+Les clients de calendrier interrogent ces adresses très souvent : chaque flux porte un ETag
+calculé par une seule requête agrégée et répond 304 tant que rien n'a changé.
+Les lignes sont lues par lots depuis un curseur et écrites au fil de l'eau.
+"""
+import csv
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import Activity, Category, FeedToken
+from .views import custom_login_required
+
+# Colonnes lues pour chaque activité d'un flux
+COLUMNS = ('id', 'title', 'description', 'location_city', 'start_time', 'end_time',
+           'updated_at', 'category__name', 'proposer__username')
+
+CSV_HEADER = ['id', 'titre', 'description', 'ville', 'debut', 'fin', 'categorie', 'organisateur', 'adresse']
+
+CONTENT_TYPES = {
+    'ics': 'text/calendar; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Taille des lots lus par le curseur
+CHUNK_SIZE = 500
+
+
+# --- Format iCalendar (RFC 5545) ---
+
+def _ics_escape(value):
+    return (
+        (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ics_date(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ics_line(line):
+    """Replie les lignes à 75 octets comme l'exige la norme (continuation par une espace)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], b''
+    for char in line:
+        char_bytes = char.encode('utf-8')
+        if len(current) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char_bytes
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_rows(rows, name, url_for):
+    host = settings.FEED_UID_DOMAIN
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//AirLibre//Activites//FR')
+    yield _ics_line('CALSCALE:GREGORIAN')
+    yield _ics_line(f'X-WR-CALNAME:{_ics_escape(name)}')
+    for row in rows:
+        yield ''.join(_ics_line(line) for line in (
+            'BEGIN:VEVENT',
+            f"UID:activity-{row['id']}@{host}",
+            f"DTSTAMP:{_ics_date(row['updated_at'])}",
+            f"LAST-MODIFIED:{_ics_date(row['updated_at'])}",
+            f"DTSTART:{_ics_date(row['start_time'])}",
+            f"DTEND:{_ics_date(row['end_time'])}",
+            f"SUMMARY:{_ics_escape(row['title'])}",
+            f"DESCRIPTION:{_ics_escape(row['description'])}",
+            f"LOCATION:{_ics_escape(row['location_city'])}",
+            f"CATEGORIES:{_ics_escape(row['category__name'])}",
+            f"URL:{url_for(row['id'])}",
+            'END:VEVENT',
+        ))
+    yield _ics_line('END:VCALENDAR')
+
+
+# --- Format CSV ---
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : renvoie chaque ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_rows(rows, name, url_for):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow([
+            row['id'], row['title'], row['description'], row['location_city'],
+            timezone.localtime(row['start_time']).isoformat(), timezone.localtime(row['end_time']).isoformat(),
+            row['category__name'] or '', row['proposer__username'], url_for(row['id']),
+        ])
+
+
+RENDERERS = {'ics': _ics_rows, 'csv': _csv_rows}
+
+
+# --- Vues ---
+
+def _feed_response(request, activities, name, fmt, filename):
+    if fmt not in RENDERERS:
+        raise Http404("Format de flux inconnu")
+
+    # Fenêtre du flux : activités à venir et récemment passées
+    activities = activities.filter(start_time__gte=timezone.now() - timedelta(days=settings.FEED_PAST_DAYS))
+
+    # Validateur : date de la dernière modification et nombre d'activités (détecte les suppressions)
+    summary = activities.aggregate(latest=Max('updated_at'), total=Count('id'))
+    etag = '"{}"'.format(hashlib.md5(
+        f"{fmt}|{name}|{summary['latest']}|{summary['total']}".encode('utf-8')
+    ).hexdigest())
+    last_modified = int(summary['latest'].timestamp()) if summary['latest'] else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        rows = activities.order_by('start_time', 'id').values(*COLUMNS).iterator(chunk_size=CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            RENDERERS[fmt](rows, name, lambda pk: request.build_absolute_uri(reverse('activity_detail', args=[pk]))),
+            content_type=CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = f'inline; filename="{filename}.{fmt}"'
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def user_feed(request, token, scoop, fmt):
+    """Flux personnel (mine : activités proposées, inscrit : inscriptions), identifié par le jeton"""
+    feed_token = get_object_or_404(FeedToken.objects.select_related('user'), token=token)
+    user = feed_token.user
+    # pylint: disable=no-member
+    if scoop == 'mine':
+        activities = Activity.objects.filter(proposer=user)
+        name = f"Activités proposées par {user.username}"
+    else:
+        activities = Activity.objects.filter(attendees=user)
+        name = f"Inscriptions de {user.username}"
+    return _feed_response(request, activities, name, fmt, f"airlibre-{scoop}")
+
+
+@require_GET
+def category_feed(request, category_id, fmt):
+    """Calendrier public des activités d'une catégorie"""
+    category = get_object_or_404(Category, pk=category_id)
+    # pylint: disable=no-member
+    activities = Activity.objects.filter(category=category)
+    return _feed_response(request, activities, f"AirLibre - {category.name}", fmt, f"airlibre-categorie-{category.pk}")
+
+
+@require_POST
+@custom_login_required("Vous devez être connecté pour gérer vos abonnements.")
+def regenerate_feed_token(request):
+    """Remplace le jeton de l'utilisateur (par exemple si une adresse d'abonnement a fuité)"""
+    FeedToken.for_user(request.user).regenerate()
+    return redirect('profile')
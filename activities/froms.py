@@ -2,7 +2,11 @@ from django import forms
 from django.contrib.auth import authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.core.validators import RegexValidator
-from .models import Activity, Category, User
+from django.db.models.functions import Lower
+from .models import Activity, User
+from .services import login_throttle
+from .services.categories import is_valid_category, model_choices, search_choices
+from .services.facets import CUSTOM, DATE_RANGE_CHOICES
 
 class LoginForm(forms.Form):
     username = forms.CharField(
@@ -21,29 +25,42 @@ class LoginForm(forms.Form):
         })
     )
 
+    def __init__(self, *args, request=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.request = request
+        # Utilisateur authentifié par clean() : le mot de passe n'est haché qu'une fois
+        self.user_cache = None
+
     def clean(self):
         cleaned_data = super().clean()
         username = cleaned_data.get('username')
         password = cleaned_data.get('password')
 
+        if not (username and password):
+            raise forms.ValidationError("Veuillez entrer à la fois le nom d'utilisateur et le mot de passe.")
 
+        ip = login_throttle.client_ip(self.request) if self.request is not None else None
+        # Vérifié avant authenticate() : une rafale de tentatives ne coûte aucun hachage
+        if login_throttle.is_throttled(username, ip):
+            raise forms.ValidationError(
+                "Trop de tentatives de connexion échouées. Veuillez réessayer dans quelques minutes.",
+                code='throttled',
+            )
 
+        self.user_cache = authenticate(self.request, username=username, password=password)
+        if self.user_cache is None:
+            login_throttle.record_failure(username, ip)
+            raise forms.ValidationError("Nom d'utilisateur ou mot de passe incorrect.", code='invalid_login')
 
-        if username and password:
-            user = authenticate(username=username, password=password)
-            if user is None:
-                raise forms.ValidationError("Nom d'utilisateur ou mot de passe incorrect.")
-        else:
-            raise forms.ValidationError("Veuillez entrer à la fois le nom d'utilisateur et le mot de passe.")
+        login_throttle.record_success(username)
+        return cleaned_data
 
+    def get_user(self):
+        return self.user_cache
 
     def save(self):
-        cleaned_data = super().clean()
-        username = cleaned_data.get('username')
-        password = cleaned_data.get('password')
-        user = authenticate(username=username, password=password)
-
-        return user
+        """Conservé pour compatibilité : renvoie l'utilisateur authentifié par clean(), sans nouveau hachage"""
+        return self.user_cache
 
 
 
@@ -125,7 +142,7 @@ class RegisterForm(UserCreationForm):
                 self.add_error('username', 'Le nom d\'utilisateur ne peut pas dépasser 30 caractères.')
 
         # Validation personnalisée pour l'adresse e-mail
-        if email and User.objects.filter(email=email).exists():
+        if email and User.objects.annotate(email_lower=Lower('email')).filter(email_lower=email.lower()).exists():
             self.add_error('email', 'Cette adresse e-mail est déjà utilisée.')
 
 
@@ -153,33 +170,85 @@ class RegisterForm(UserCreationForm):
 
 
 
+class MultiSelectField(forms.MultipleChoiceField):
+    """Choix multiple qui accepte aussi une valeur unique (?category=Kayak)"""
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            value = [value]
+        return super().to_python(value)
+
+
+class FreeMultiSelectField(MultiSelectField):
+    """Choix multiple sans liste fermée (villes saisies librement par les organisateurs)"""
+
+    def valid_value(self, value):
+        return len(value) <= 100
+
+    def clean(self, value):
+        values = super().clean(value)
+        # Retirer les doublons et les valeurs vides en conservant l'ordre
+        return list(dict.fromkeys(v.strip() for v in values if v.strip()))
+
+
 class ArticleSearchForm(forms.Form):
-    # pylint: disable=no-member
-    option = Category.objects.all().values_list('name', 'name')
+    q = forms.CharField(
+        label="Rechercher",
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'type': 'search',
+            'placeholder': 'Titre, description ou ville...',
+        })
+    )
 
-    category = forms.ChoiceField(
-        choices=[
-            ('all', 'Toutes les activités'),
-        ] + list(option),
+    # Les choix sont lus dans le registre des catégories en cache à chaque instanciation
+    category = MultiSelectField(
+        choices=search_choices,
         label="Catégorie",
         required=False,
-        widget=forms.Select(attrs={
-            'class': 'form-select',
-            'onchange': 'this.form.submit()'
-        })
+    )
+    city = FreeMultiSelectField(
+        label="Ville",
+        required=False,
+    )
+    when = forms.ChoiceField(
+        choices=DATE_RANGE_CHOICES,
+        label="Date",
+        required=False,
+    )
+    date_from = forms.DateField(
+        label="Du",
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
+    )
+    date_to = forms.DateField(
+        label="Au",
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
     )
 
     def clean(self):
         cleaned_data = super().clean()
-        category = cleaned_data.get('category')
+        # « all » (toutes les activités) équivaut à aucun filtre de catégorie
+        categories = [name for name in cleaned_data.get('category') or [] if name != 'all']
 
-        # Validation de la catégorie : vérifier qu'elle existe dans les choix valides
-        if category:
-            valid_categories = [choice[0] for choice in self.fields['category'].choices]
-            if category not in valid_categories:
+        # Validation des catégories : vérifier qu'elles existent dans les choix valides (recherche O(1))
+        for category in categories:
+            if not is_valid_category(category):
                 raise forms.ValidationError({
                     'category': f'La catégorie "{category}" n\'est pas valide. Veuillez choisir une catégorie dans la liste.'
                 })
+        cleaned_data['category'] = categories
+
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if cleaned_data.get('when') == CUSTOM:
+            if not date_from and not date_to:
+                raise forms.ValidationError({'date_from': "Indiquez au moins une date pour la période personnalisée."})
+            if date_from and date_to and date_from > date_to:
+                raise forms.ValidationError({'date_to': "La date de fin doit suivre la date de début."})
 
         return cleaned_data
 
@@ -262,7 +331,10 @@ class UserEditForm(forms.ModelForm):
         # Valider seulement les champs qui ont été remplis/modifiés
         if email and email.strip():
             # Vérifier que l'email n'est pas déjà utilisé par un autre utilisateur
-            if User.objects.filter(email=email).exclude(id=self.user.id).exists():
+            # Comparaison insensible à la casse, servie par l'index user_email_lower_idx
+            if User.objects.annotate(email_lower=Lower('email')).filter(
+                email_lower=email.strip().lower()
+            ).exclude(id=self.user.id).exists():
                 self.add_error('email', 'Cette adresse courriel est déjà utilisée par un autre utilisateur.')
 
         if first_name and first_name.strip():
@@ -319,7 +391,7 @@ class UserEditForm(forms.ModelForm):
 class addNewActivity(forms.ModelForm):
     class Meta:
         model = Activity
-        fields = ['title', 'description', 'location_city', 'start_time', 'end_time', 'category']
+        fields = ['title', 'description', 'location_city', 'start_time', 'end_time', 'category', 'capacity']
         labels = {
             'title': 'Titre de l\'activité',
             'description': 'Description',
@@ -327,6 +399,7 @@ class addNewActivity(forms.ModelForm):
             'start_time': 'Date et heure de début',
             'end_time': 'Date et heure de fin',
             'category': 'Catégorie',
+            'capacity': 'Nombre de places',
         }
         widgets = {
             'title': forms.TextInput(attrs={
@@ -368,9 +441,20 @@ class addNewActivity(forms.ModelForm):
             'category': forms.Select(attrs={
                 'class': 'form-select',
                 'required': True
+            }),
+            'capacity': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Illimité',
+                'aria-describedby': 'id_capacity-help',
+                'min': '1'
             })
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Afficher les catégories depuis le registre en cache (la validation reste faite par le queryset)
+        self.fields['category'].choices = model_choices()
+
     def clean(self):
         cleaned_data = super().clean()
         title = cleaned_data.get('title')
@@ -406,6 +490,10 @@ class addNewActivity(forms.ModelForm):
         if not category:
             self.add_error('category', 'Veuillez sélectionner une catégorie.')
 
+        capacity = cleaned_data.get('capacity')
+        if capacity is not None and capacity < 1:
+            self.add_error('capacity', 'Le nombre de places doit être d\'au moins 1.')
+
         return cleaned_data
 
     def save(self, commit=True):
@@ -0,0 +1,111 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from activities.models import Activity, Category, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit en lecture/écriture sous charge concurrente avec le profil de base de données "
+        "configuré (DB_ENGINE, DB_SQLITE_TUNED, DB_POOL...), sur une base de test temporaire"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Nombre de clients simultanés")
+        parser.add_argument('--seconds', type=float, default=10, help="Durée de la mesure")
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help="Proportion d'écritures (inscriptions) parmi les opérations")
+        parser.add_argument('--activities', type=int, default=5000, help="Nombre d'activités générées")
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES['default']
+        tmpdir = None
+        if database['ENGINE'].endswith('sqlite3'):
+            # Base SQLite sur disque (et non en mémoire) pour que le journal WAL s'applique
+            tmpdir = tempfile.mkdtemp()
+            database.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            activity_ids, user_ids = self.seed(options['activities'])
+            with connection.cursor() as cursor:
+                settings_summary = self.describe(cursor)
+            stats = self.run_load(activity_ids, user_ids, options)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+
+        elapsed = options['seconds']
+        self.stdout.write(f"Profil : {settings_summary}")
+        self.stdout.write(f"Clients : {options['threads']}, durée : {elapsed:.0f} s, écritures : {options['write_ratio']:.0%}")
+        self.stdout.write(f"Lectures  : {stats['reads'] / elapsed:10.1f} op/s")
+        self.stdout.write(f"Écritures : {stats['writes'] / elapsed:10.1f} op/s")
+        self.stdout.write(f"Erreurs (verrous) : {stats['errors']}")
+
+    def describe(self, cursor):
+        if connection.vendor != 'sqlite':
+            return f"{connection.vendor}, CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}"
+        pragmas = {}
+        for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+            cursor.execute(f'PRAGMA {pragma}')
+            pragmas[pragma] = cursor.fetchone()[0]
+        return "sqlite, " + ", ".join(f"{key}={value}" for key, value in pragmas.items())
+
+    def seed(self, activity_count):
+        now = timezone.now()
+        users = User.objects.bulk_create(User(username=f'charge{i}') for i in range(500))
+        category = Category.objects.create(name='Charge')
+        activities = Activity.objects.bulk_create(
+            Activity(
+                title="Activité de charge", description="Description de charge générée.",
+                location_city=f'Ville {i % 50}', start_time=now + timedelta(hours=i),
+                end_time=now + timedelta(hours=i + 2), proposer=users[i % len(users)], category=category,
+            )
+            for i in range(activity_count)
+        )
+        return [activity.id for activity in activities], [user.id for user in users]
+
+    def run_load(self, activity_ids, user_ids, options):
+        stats = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def client(seed):
+            rng = random.Random(seed)
+            reads = writes = errors = 0
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        if rng.random() < options['write_ratio']:
+                            Activity.attendees.through.objects.get_or_create(
+                                activity_id=rng.choice(activity_ids), user_id=rng.choice(user_ids)
+                            )
+                            writes += 1
+                        else:
+                            list(Activity.objects.upcoming().for_cards().order_by('start_time', 'id')[:12])
+                            reads += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    stats['reads'] += reads
+                    stats['writes'] += writes
+                    stats['errors'] += errors
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
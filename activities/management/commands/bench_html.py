@@ -0,0 +1,87 @@
+import copy
+import gzip
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+
+from activities.models import Activity, Category, User
+from activities.storage import brotli
+
+
+# Chargeurs de templates d'origine, sans retrait des espaces
+PLAIN_LOADERS = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la taille des pages HTML rendues (templates d'origine / allégés, "
+        "sans compression / gzip / brotli) sur une base de test générée"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=30,
+                            help="Nombre d'activités à générer")
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            user, activity = self.seed(options['activities'])
+            pages = {
+                'accueil': reverse('index'),
+                'liste': reverse('activity_list'),
+                'détail': reverse('activity_detail', args=[activity.pk]),
+                'profil': reverse('profile'),
+            }
+            plain_templates = copy.deepcopy(settings.TEMPLATES)
+            plain_templates[0]['OPTIONS']['loaders'] = PLAIN_LOADERS
+            with override_settings(TEMPLATES=plain_templates):
+                plain = self.measure(user, pages)
+            minified = self.measure(user, pages)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        header = f"{'Page':<10}{'origine':>10}{'allégée':>10}{'gzip':>10}{'brotli':>10}{'gain':>8}"
+        self.stdout.write(header)
+        for name in pages:
+            original = len(plain[name])
+            body = minified[name]
+            gzipped = len(gzip.compress(body, compresslevel=6))
+            brotli_size = len(brotli.compress(body, quality=5)) if brotli is not None else None
+            best = min(size for size in (gzipped, brotli_size) if size is not None)
+            self.stdout.write(
+                f"{name:<10}{original:>10}{len(body):>10}{gzipped:>10}"
+                f"{brotli_size if brotli_size is not None else '-':>10}{1 - best / original:>8.0%}"
+            )
+
+    def seed(self, activity_count):
+        now = timezone.now()
+        user = User.objects.create_user(username='bench_html', password='bench_html')
+        category = Category.objects.create(name='Randonnée')
+        activities = [
+            Activity.objects.create(
+                title=f"Sortie en plein air {i}", description="Une belle sortie en nature. " * 10,
+                location_city='Montréal', start_time=now + timedelta(days=i + 1),
+                end_time=now + timedelta(days=i + 1, hours=2), proposer=user, category=category,
+            )
+            for i in range(activity_count)
+        ]
+        return user, activities[0]
+
+    @staticmethod
+    def measure(user, pages):
+        """Corps (non compressé) de chaque page, pour un utilisateur connecté"""
+        cache.clear()
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+        return {name: client.get(url).content for name, url in pages.items()}
@@ -0,0 +1,126 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from activities.models import Activity, Category, User
+
+
+# Index ajoutés par la migration 0003_query_indexes (retirés pour la seconde mesure)
+MODEL_INDEXES = [
+    (Activity, 'activity_start_idx'),
+    (Activity, 'activity_category_start_idx'),
+    (Activity, 'activity_proposer_start_idx'),
+    (Activity, 'activity_city_start_idx'),
+    (User, 'user_email_lower_idx'),
+]
+ATTENDEES_USER_INDEX = 'activity_attendees_user_idx'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les requêtes principales avec et sans les index de 0003_query_indexes "
+        "sur une base de test générée (jamais sur la base configurée)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=1_000_000,
+                            help="Nombre d'activités à générer")
+        parser.add_argument('--users', type=int, default=10_000,
+                            help="Nombre d'utilisateurs à générer")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Nombre d'exécutions par requête")
+
+    def handle(self, *args, **options):
+        # Base de test temporaire : créée, migrée puis détruite à la fin
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.seed(options['activities'], options['users'])
+            with_indexes = self.measure(options['repeat'])
+            self.drop_indexes()
+            without_indexes = self.measure(options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(f"\n{'Requête':<28}{'sans index (ms)':>18}{'avec index (ms)':>18}{'gain':>8}")
+        for name, (with_ms, _) in with_indexes.items():
+            without_ms, _ = without_indexes[name]
+            gain = without_ms / with_ms if with_ms else float('inf')
+            self.stdout.write(f"{name:<28}{without_ms:>18.2f}{with_ms:>18.2f}{gain:>7.1f}x")
+        for name, (_, with_plan) in with_indexes.items():
+            self.stdout.write(f"\n[{name}]\n  sans index : {without_indexes[name][1]}\n  avec index : {with_plan}")
+
+    def seed(self, activity_count, user_count, batch_size=10_000):
+        self.stdout.write(f"Génération de {user_count} utilisateurs et {activity_count} activités...")
+        rng = random.Random(42)
+        now = timezone.now()
+
+        User.objects.bulk_create(
+            (User(username=f'bench{i}', email=f'Bench{i}@Example.com') for i in range(user_count)),
+            batch_size=batch_size,
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        categories = Category.objects.bulk_create(Category(name=f'Catégorie {i}') for i in range(10))
+        cities = [f'Ville {i}' for i in range(500)]
+
+        # bulk_create contourne Activity.save() (qui refuse les dates passées)
+        for start in range(0, activity_count, batch_size):
+            activities = []
+            for _ in range(min(batch_size, activity_count - start)):
+                start_time = now + timedelta(minutes=rng.randint(-525_600, 525_600))
+                activities.append(Activity(
+                    title="Activité de test", description="Description de test générée.",
+                    location_city=rng.choice(cities), start_time=start_time,
+                    end_time=start_time + timedelta(hours=2),
+                    proposer_id=rng.choice(user_ids), category=rng.choice(categories),
+                ))
+            created = Activity.objects.bulk_create(activities)
+            Activity.attendees.through.objects.bulk_create(
+                (Activity.attendees.through(activity_id=activity.id, user_id=rng.choice(user_ids))
+                 for activity in created),
+                ignore_conflicts=True,
+            )
+
+        # Statistiques pour le planificateur (ANALYZE existe sur SQLite et PostgreSQL)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def queries(self):
+        user = User.objects.order_by('id')[99]
+        category = Category.objects.first()
+        upcoming = Activity.objects.upcoming()
+        return {
+            'à venir': upcoming.order_by('start_time', 'id')[:12],
+            'à venir par catégorie': upcoming.filter(category=category).order_by('start_time')[:12],
+            'par organisateur': Activity.objects.filter(proposer=user).order_by('-start_time')[:50],
+            'inscriptions': Activity.objects.filter(attendees=user).order_by('-start_time')[:50],
+            'à venir par ville': upcoming.filter(location_city='Ville 7').order_by('start_time')[:12],
+            'courriel (casse ignorée)': User.objects.annotate(email_lower=Lower('email'))
+                                            .filter(email_lower='bench99@example.com'),
+        }
+
+    def measure(self, repeat):
+        results = {}
+        for name, queryset in self.queries().items():
+            plan = ' | '.join(line.strip() for line in queryset.explain().splitlines())
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            results[name] = (elapsed_ms, plan)
+        return results
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, name in MODEL_INDEXES:
+                editor.remove_index(model, self.get_index(model, name))
+            editor.execute(f'DROP INDEX {ATTENDEES_USER_INDEX}')
+
+    @staticmethod
+    def get_index(model, name):
+        return next(index for index in model._meta.indexes if index.name == name)
@@ -0,0 +1,81 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from activities.models import Activity, Category, User
+from activities.services.search import rebuild_index, search_activities
+
+
+WORDS = [
+    'randonnée', 'vélo', 'kayak', 'escalade', 'pique-nique', 'montagne', 'rivière', 'forêt',
+    'lac', 'sentier', 'observation', 'oiseaux', 'course', 'famille', 'débutants', 'coucher',
+    'soleil', 'raquettes', 'canot', 'camping', 'yoga', 'plage', 'parc', 'marche',
+]
+CITIES = ['Montréal', 'Québec', 'Sherbrooke', 'Gatineau', 'Trois-Rivières', 'Lévis', 'Laval']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la recherche plein texte (FTS5 / tsvector) à icontains "
+        "sur une base de test générée (jamais sur la base configurée)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--activities', type=int, default=200_000,
+                            help="Nombre d'activités à générer")
+        parser.add_argument('--repeat', type=int, default=10,
+                            help="Nombre d'exécutions par requête")
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.seed(options['activities'])
+            results = {term: self.measure(term, options['repeat']) for term in ('kayak', 'randonnees', 'riviere lac')}
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(f"\n{'Recherche':<16}{'icontains (ms)':>16}{'résultats':>11}{'plein texte (ms)':>18}{'résultats':>11}")
+        for term, (contains_ms, contains_count, fts_ms, fts_count) in results.items():
+            self.stdout.write(f"{term:<16}{contains_ms:>16.2f}{contains_count:>11}{fts_ms:>18.2f}{fts_count:>11}")
+
+    def seed(self, activity_count, batch_size=10_000):
+        self.stdout.write(f"Génération de {activity_count} activités...")
+        rng = random.Random(42)
+        now = timezone.now()
+        user = User.objects.create(username='bench_search')
+        category = Category.objects.create(name='Recherche')
+
+        # bulk_create ne déclenche pas post_save : l'index est reconstruit à la fin
+        for start in range(0, activity_count, batch_size):
+            Activity.objects.bulk_create(
+                Activity(
+                    title=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                    description=' '.join(rng.choices(WORDS, k=30)),
+                    location_city=rng.choice(CITIES),
+                    start_time=now + timedelta(hours=i), end_time=now + timedelta(hours=i + 2),
+                    proposer=user, category=category,
+                )
+                for i in range(start, min(start + batch_size, activity_count))
+            )
+        rebuild_index()
+
+    def measure(self, term, repeat):
+        contains = Activity.objects.all()
+        for word in term.split():
+            contains = contains.filter(
+                Q(title__icontains=word) | Q(description__icontains=word) | Q(location_city__icontains=word)
+            )
+        full_text = search_activities(Activity.objects.all(), term)
+        return (*self.time(contains[:50], repeat), *self.time(full_text[:50], repeat))
+
+    @staticmethod
+    def time(queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            rows = list(queryset.all())
+        return (time.perf_counter() - started) * 1000 / repeat, len(rows)
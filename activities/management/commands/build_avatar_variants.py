@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from activities.models import User
+from activities.services.avatars import generate_variants
+
+
+class Command(BaseCommand):
+    help = "Génère les variantes redimensionnées (WebP et JPEG) des avatars existants"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Régénérer aussi les avatars dont les variantes sont déjà prêtes")
+
+    def handle(self, *args, **options):
+        # pylint: disable=no-member
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['force']:
+            users = users.exclude(avatar_variants_for=F('avatar'))
+
+        done = failed = 0
+        for user_id, avatar_name in users.values_list('id', 'avatar').iterator():
+            try:
+                generate_variants(user_id, avatar_name)
+                done += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f"{avatar_name} : {e}")
+        self.stdout.write(self.style.SUCCESS(f"{done} avatar(s) traité(s), {failed} échec(s)"))
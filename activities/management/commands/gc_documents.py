@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from activities.models import Activity, DocumentBlob
+from activities.storage import document_storage, is_blob_name
+
+
+class Command(BaseCommand):
+    help = "Supprime les documents d'activité qui ne sont plus référencés (stockage adressé par contenu)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=settings.DOCUMENT_GC_GRACE_HOURS,
+                            help="Ne supprimer que les contenus inutilisés depuis au moins ce nombre d'heures")
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help="Déplacer d'abord les documents des anciens dossiers activity_<id> dans le stockage dédupliqué")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Afficher ce qui serait supprimé sans rien supprimer")
+
+    def handle(self, *args, **options):
+        if options['adopt_legacy']:
+            self.adopt_legacy(options['dry_run'])
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        candidates = DocumentBlob.unreferenced().filter(last_used_at__lt=cutoff)
+
+        deleted = freed = 0
+        for blob_id, name, size in candidates.values_list('id', 'name', 'size').iterator():
+            if options['dry_run']:
+                self.stdout.write(f"{name} ({size} octets)")
+            # Revérifier l'âge au moment de la suppression : le contenu a pu être réutilisé entre-temps
+            elif DocumentBlob.objects.filter(pk=blob_id, last_used_at__lt=cutoff).delete()[0]:
+                # Un téléversement du même contenu a pu recréer la ligne juste après : il
+                # compte alors sur le fichier existant, qu'il ne faut plus effacer
+                if DocumentBlob.objects.filter(name=name).exists():
+                    continue
+                document_storage.delete(name)
+            else:
+                continue
+            deleted += 1
+            freed += size
+
+        verb = "seraient supprimés" if options['dry_run'] else "supprimés"
+        self.stdout.write(self.style.SUCCESS(f"{deleted} document(s) {verb}, {freed} octets libérés"))
+
+    def adopt_legacy(self, dry_run):
+        """Les anciens noms (documents/activity_<id>/doc_<uuid>.pdf) sont recopiés sous leur empreinte"""
+        # pylint: disable=no-member
+        activities = Activity.objects.exclude(document='').exclude(document__isnull=True)
+        adopted = missing = 0
+        for activity_id, old_name in activities.values_list('id', 'document').iterator():
+            if is_blob_name(old_name):
+                continue
+            if not document_storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f"Fichier introuvable : {old_name}")
+                continue
+            if dry_run:
+                self.stdout.write(f"{old_name} serait déplacé")
+                adopted += 1
+                continue
+            with document_storage.open(old_name, 'rb') as source:
+                new_name = document_storage.save(old_name, File(source))
+            # update() : ne pas repasser par Activity.clean(), qui refuse les activités passées
+            Activity.objects.filter(pk=activity_id, document=old_name).update(document=new_name)
+            if not Activity.objects.filter(document=old_name).exists():
+                document_storage.delete(old_name)
+            adopted += 1
+        self.stdout.write(f"{adopted} ancien(s) document(s) déplacé(s), {missing} introuvable(s)")
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from activities.models import Activity
+from activities.services.aqi import refresh_many
+
+
+def upcoming_cities(limit):
+    """
+    Retourne les villes distinctes des activités à venir, de la plus proche à la plus lointaine.
+    Les noms sont normalisés comme les clés du cache AQI (espaces, casse) avant d'éliminer les doublons.
+    """
+    # pylint: disable=no-member
+    rows = (
+        Activity.objects.filter(start_time__gte=timezone.now())
+        .exclude(location_city='')
+        .values('location_city')
+        .annotate(next_start=Min('start_time'))
+        .order_by('next_start')
+    )
+
+    cities = {}
+    for row in rows.iterator():
+        city = row['location_city'].strip()
+        if not city:
+            continue
+        cities.setdefault(city.lower(), city)
+        if len(cities) >= limit:
+            break
+    return list(cities.values())
+
+
+class Command(BaseCommand):
+    help = "Préchauffe le cache de qualité de l'air pour les villes des activités à venir"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Répéter le préchauffage indéfiniment")
+        parser.add_argument('--interval', type=int, default=settings.AQI_PREWARM_INTERVAL,
+                            help="Délai entre deux passes en mode boucle (secondes)")
+        parser.add_argument('--workers', type=int, default=settings.AQI_PREWARM_WORKERS,
+                            help="Nombre maximal de requêtes simultanées vers l'API")
+        parser.add_argument('--max-cities', type=int, default=settings.AQI_PREWARM_MAX_CITIES,
+                            help="Nombre maximal de villes rafraîchies par passe")
+
+    def handle(self, *args, **options):
+        while True:
+            self.prewarm(options['workers'], options['max_cities'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def prewarm(self, workers, max_cities):
+        cities = upcoming_cities(max_cities)
+        results = refresh_many(cities, max_workers=workers)
+
+        errors = {city: error for city, error in results.items() if error}
+        for city, error in errors.items():
+            self.stderr.write(f"[AQI] {city}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(results) - len(errors)}/{len(results)} ville(s) préchauffée(s)"
+        ))
@@ -0,0 +1,241 @@
+"""
+Service des fichiers téléversés (MEDIA_URL) : avatars et documents d'activité.
+
+    /media/avatars/...      public (affichés sur les pages publiques)
+    /media/documents/...    réservé aux utilisateurs connectés
+
+La vérification des droits ne fait aucune requête en base. Le transfert est ensuite confié
+au serveur web frontal si MEDIA_SENDFILE_BACKEND est configuré (X-Sendfile pour Apache ou
+lighttpd, X-Accel-Redirect pour nginx), sinon le fichier est diffusé par morceaux par
+Django, avec prise en charge des requêtes partielles (Range).
+
+Les documents sont nommés d'après l'empreinte de leur contenu (storage.py) : leur contenu ne
+change jamais et ils peuvent être mis en cache un an. Les avatars gardent le même nom d'un
+téléversement à l'autre et sont revalidés par ETag.
+
+Les fichiers statiques (STATIC_URL) sont servis par serve_static : variante .br ou .gz
+choisie selon Accept-Encoding, cache d'un an pour les noms empreintés du manifeste.
+"""
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import ENCODINGS, is_blob_name
+from .views import redirect_to_login_with_message
+
+
+# Durée de cache des fichiers au nom immuable (un an)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Taille des morceaux lus pour une réponse partielle
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _can_read(request, name):
+    """Retourne None si l'accès est permis, sinon la réponse à renvoyer"""
+    area = name.split('/', 1)[0]
+    if area == 'avatars':
+        return None
+    if area == 'documents':
+        if request.user.is_authenticated:
+            return None
+        return redirect_to_login_with_message(request, "Vous devez être connecté pour consulter les documents.")
+    raise Http404("Fichier introuvable")
+
+
+def _parse_range(header, size):
+    """
+    Retourne (début, fin) inclus pour un en-tête « bytes=a-b » portant sur une seule plage,
+    None si l'en-tête est absent ou ignoré (plages multiples), ou lève ValueError si la plage
+    ne peut pas être satisfaite.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N : les N derniers octets
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _file_response(request, path, size, etag, content_type=None):
+    """Diffuse le fichier depuis Django (entier ou une seule plage d'octets)"""
+    range_header = request.META.get('HTTP_RANGE')
+    # If-Range : la plage n'est servie que si le client a encore la même version
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and if_range and if_range != etag:
+        range_header = None
+
+    try:
+        byte_range = _parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+        response['Content-Type'] = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _sendfile_response(path, name):
+    """Réponse vide : le serveur frontal lit le fichier et gère lui-même les plages"""
+    response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if settings.MEDIA_SENDFILE_BACKEND == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + name
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def _stat_file(path):
+    """Retourne os.stat(path) pour un fichier ordinaire, sinon None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat if S_ISREG(stat.st_mode) else None
+
+
+def _file_etag(stat):
+    return f'"{int(stat.st_mtime_ns):x}-{stat.st_size:x}"'
+
+
+def accepted_encodings(request):
+    """Codages acceptés par le client (en-tête Accept-Encoding), sans ceux refusés par q=0"""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip().replace(' ', '')
+        if coding and quality not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve_media(request, name):
+    denied = _can_read(request, name)
+    if denied is not None:
+        return denied
+
+    if '/.' in f'/{name}':
+        # Fichiers cachés, dont les écritures en cours (documents/.tmp)
+        raise Http404("Fichier introuvable")
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation as e:
+        raise Http404("Fichier introuvable") from e
+    stat = _stat_file(path)
+    if stat is None:
+        raise Http404("Fichier introuvable")
+
+    immutable = is_blob_name(name)
+    if immutable:
+        # Le nom est l'empreinte du contenu : c'est un validateur fort tout trouvé
+        etag = '"{}"'.format(os.path.splitext(os.path.basename(name))[0])
+    else:
+        etag = _file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if settings.MEDIA_SENDFILE_BACKEND:
+            response = _sendfile_response(path, name)
+        else:
+            response = _file_response(request, path, stat.st_size, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Les documents réservés aux utilisateurs connectés ne doivent pas rester dans un cache partagé
+    visibility = {'private': True} if name.startswith('documents/') else {'public': True}
+    if immutable:
+        patch_cache_control(response, max_age=IMMUTABLE_MAX_AGE, immutable=True, **visibility)
+    else:
+        patch_cache_control(response, no_cache=True, **visibility)
+    return response
+
+
+@require_safe
+def serve_static(request, name):
+    """
+    Sert un fichier de STATIC_ROOT, précompressé si le client l'accepte. Les noms empreintés
+    (style.3f2a9c….css) sont mis en cache un an ; les autres sont revalidés à chaque visite.
+    """
+    if '/.' in f'/{name}' or name.endswith(tuple(ENCODINGS)):
+        raise Http404("Fichier introuvable")
+    try:
+        path = staticfiles_storage.path(name)
+    except SuspiciousFileOperation as e:
+        raise Http404("Fichier introuvable") from e
+    stat = _stat_file(path)
+    if stat is None:
+        raise Http404("Fichier introuvable")
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    accepted = accepted_encodings(request)
+    for extension, coding in ENCODINGS.items():
+        if coding in accepted:
+            variant_stat = _stat_file(path + extension)
+            if variant_stat is not None:
+                path, stat, encoding = path + extension, variant_stat, coding
+                break
+
+    # L'ETag dépend du fichier réellement servi : une variante compressée a le sien
+    etag = _file_etag(stat)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(int(stat.st_mtime))
+    response['Vary'] = 'Accept-Encoding'
+    is_fingerprinted = getattr(staticfiles_storage, 'is_fingerprinted', None)
+    if is_fingerprinted is not None and is_fingerprinted(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,84 @@
+"""
+Compression des réponses texte (HTML, JSON, iCalendar, CSV...) selon Accept-Encoding.
+
+Brotli est préféré quand le paquet « brotli » est installé et que le client l'accepte ;
+sinon gzip (GZipMiddleware de Django). Les réponses diffusées en continu sont compressées
+au fil de l'eau.
+
+BREACH : une page qui contient un jeton CSRF et reflète une saisie de l'utilisateur (recherche)
+peut laisser deviner le jeton d'après la taille compressée. Django masque déjà le jeton
+différemment à chaque réponse ; en plus, ces pages ne sont jamais compressées en brotli mais
+en gzip avec un nom de fichier aléatoire de longueur variable dans l'en-tête (« Heal the
+BREACH »), qui brouille la taille des réponses.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from .media import accepted_encodings
+from .storage import brotli
+
+
+# Types de contenu compressés (les images, PDF et archives le sont déjà)
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+# En dessous de cette taille, la compression ne fait rien gagner
+MIN_SIZE = 200
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=5)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _weaken_etag(response):
+    # RFC 9110 : la représentation compressée n'est plus identique octet pour octet
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        # Une réponse partielle (206) compte ses octets avant compression (Content-Range)
+        if response.status_code != 200 or response.has_header('Content-Range'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < MIN_SIZE:
+            return response
+
+        accepted = accepted_encodings(request)
+        # get_token() a été appelé : CsrfViewMiddleware (placé après) a alors renvoyé le cookie
+        has_csrf_token = (
+            settings.CSRF_COOKIE_NAME in response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE', False)
+        )
+        if brotli is None or has_csrf_token or getattr(response, 'is_async', False) or 'br' not in accepted:
+            if 'gzip' in accepted:
+                return super().process_response(request, response)
+            # gzip;q=0 : refusé explicitement (GZipMiddleware ne regarde pas la valeur de q)
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = _brotli_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=5)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+        _weaken_etag(response)
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_reserved_count(apps, schema_editor):
+    """Initialise le compteur de places réservées à partir des participants existants"""
+    Activity = apps.get_model('activities', 'Activity')
+    for activity in Activity.objects.annotate(total=models.Count('attendees')).iterator():
+        Activity.objects.filter(pk=activity.pk).update(reserved_count=activity.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Laisser vide pour un nombre de places illimité', null=True, verbose_name='Nombre de places'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='reserved_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Compteur maintenu par les réservations (voir services/reservations.py)', verbose_name='Places réservées'),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name="Date d'inscription")),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='activities.activity', verbose_name='Activité')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Inscription en liste d'attente",
+                'verbose_name_plural': "Liste d'attente",
+                'ordering': ['created_at', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('activity', 'user'), name='unique_waitlist_entry')],
+            },
+        ),
+        migrations.RunPython(fill_reserved_count, migrations.RunPython.noop),
+    ]
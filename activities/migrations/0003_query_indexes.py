@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# Index inverse sur la table des participants : (user_id, activity_id) pour les requêtes
+# « activités auxquelles un utilisateur est inscrit », triées ensuite par activité
+ATTENDEES_USER_INDEX = 'activity_attendees_user_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0002_activity_capacity_waitlist'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['start_time', 'id'], name='activity_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['category', 'start_time'], name='activity_category_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['proposer', 'start_time'], name='activity_proposer_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['location_city', 'start_time'], name='activity_city_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='user_email_lower_idx'),
+        ),
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {ATTENDEES_USER_INDEX} ON activities_activity_attendees (user_id, activity_id)',
+            reverse_sql=f'DROP INDEX {ATTENDEES_USER_INDEX}',
+        ),
+    ]
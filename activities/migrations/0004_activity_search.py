@@ -0,0 +1,67 @@
+from django.db import migrations
+
+from activities.services.search import FTS_TABLE, TSVECTOR_COLUMN, rebuild_index
+
+
+# PostgreSQL : unaccent() n'est pas IMMUTABLE, ce qui est requis dans une colonne générée.
+# L'enveloppe fixe le dictionnaire utilisé et peut donc être déclarée IMMUTABLE.
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION activities_unaccent(text) RETURNS text
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    f"""
+    ALTER TABLE activities_activity ADD COLUMN {TSVECTOR_COLUMN} tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('french', activities_unaccent(coalesce(title, ''))), 'A') ||
+        setweight(to_tsvector('french', activities_unaccent(coalesce(location_city, ''))), 'B') ||
+        setweight(to_tsvector('french', activities_unaccent(coalesce(description, ''))), 'C')
+    ) STORED
+    """,
+    f"CREATE INDEX activity_search_vector_idx ON activities_activity USING GIN ({TSVECTOR_COLUMN})",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS activity_search_vector_idx",
+    f"ALTER TABLE activities_activity DROP COLUMN IF EXISTS {TSVECTOR_COLUMN}",
+    "DROP FUNCTION IF EXISTS activities_unaccent(text)",
+]
+
+# SQLite : table FTS5 indépendante (rowid = id de l'activité) remplie avec le texte déjà
+# normalisé par services.search (accents retirés, racinisation légère du français)
+SQLITE_SQL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "title, description, location_city, tokenize = 'unicode61 remove_diacritics 2')",
+]
+SQLITE_REVERSE_SQL = [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_SQL
+    elif vendor == 'sqlite':
+        statements = SQLITE_SQL
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+    rebuild_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_activity_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Mise à jour à chaque modification, y compris des participants (voir signals.py)', verbose_name='Dernière modification'),
+        ),
+    ]
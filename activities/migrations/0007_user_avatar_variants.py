@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0006_feed_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants_for',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Avatar dont les variantes redimensionnées sont prêtes (voir services/avatars.py)', max_length=255),
+        ),
+    ]
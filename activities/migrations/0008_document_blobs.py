@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:48
+
+import activities.models
+import activities.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0007_user_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Chemin')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Taille (octets)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Renouvelée à chaque téléversement du même contenu', verbose_name='Dernière utilisation')),
+            ],
+            options={
+                'verbose_name': 'Contenu de document',
+                'verbose_name_plural': 'Contenus de documents',
+            },
+        ),
+        migrations.AlterField(
+            model_name='activity',
+            name='document',
+            field=models.FileField(blank=True, help_text="Joindre un document à l'activité (PDF, DOC, DOCX, images - 5MB max)", null=True, storage=activities.storage.ContentAddressedStorage(), upload_to=activities.models.document_upload_path, validators=[activities.models.validate_file_extension, activities.models.validate_file_size], verbose_name='Document joint'),
+        ),
+    ]
@@ -1,10 +1,14 @@
 from django.db import models
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.validators import MinLengthValidator, MaxLengthValidator
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 import os
+import secrets
+
+from .storage import document_storage
 
 
 def validate_avatar_extension(value):
@@ -38,13 +42,12 @@ def validate_file_size(value):
 
 
 def document_upload_path(instance, filename):
-    """Génère un chemin de téléversement pour les documents d'activité"""
-    import uuid
-    # Garder l'extension originale
-    ext = os.path.splitext(filename)[1]
-    # Créer un nom de fichier unique
-    new_filename = f"doc_{uuid.uuid4().hex[:8]}{ext}"
-    return f'documents/activity_{instance.id}/{new_filename}'
+    """
+    Nom provisoire d'un document d'activité : seule l'extension est conservée,
+    le nom définitif est l'empreinte du contenu (voir storage.py)
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    return f'documents/upload{ext}'
 
 
 # Créer un chemin de téléversement pour l'avatar (réfernce youtube)
@@ -69,6 +72,13 @@ class User(AbstractUser):
         help_text="Téléchargez une image pour votre avatar (JPG, PNG, GIF ou WebP - 2MB max)",
         validators=[validate_avatar_extension, validate_avatar_size]
     )
+    avatar_variants_for = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Avatar dont les variantes redimensionnées sont prêtes (voir services/avatars.py)",
+    )
     bio = models.TextField(
         verbose_name="Biographie",
         blank=True,
@@ -81,6 +91,10 @@ class User(AbstractUser):
         ordering = ['username']
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
+        indexes = [
+            # Recherche des courriels sans tenir compte de la casse (RegisterForm, UserEditForm)
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
 
 
 
@@ -115,6 +129,48 @@ class Category(models.Model):
         return str(self.name)
 
 
+class ActivityQuerySet(models.QuerySet):
+    """Requêtes partagées par les vues qui affichent des activités"""
+
+    def upcoming(self):
+        """Activités dont la date de début n'est pas encore passée"""
+        return self.filter(start_time__gte=timezone.now())
+
+    def for_cards(self):
+        """
+        Charge tout ce qu'affichent les cartes d'activités en un nombre fixe de requêtes :
+        catégorie et organisateur joints, nombre de participants annoté (activity.attendee_count).
+        Le nombre est calculé par une sous-requête pour rester exact même si le queryset
+        est ensuite filtré sur les participants.
+        """
+        attendee_count = (
+            Activity.attendees.through.objects
+            .filter(activity_id=models.OuterRef('pk'))
+            .order_by()
+            .values('activity_id')
+            .annotate(total=models.Count('*'))
+            .values('total')
+        )
+        return self.select_related('category', 'proposer').annotate(
+            attendee_count=Coalesce(models.Subquery(attendee_count), 0)
+        )
+
+
+    def touch(self):
+        """Met à jour updated_at sans passer par save() (changements de participants, de liste d'attente...)"""
+        return self.update(updated_at=timezone.now())
+
+    def stats_for(self, user):
+        """
+        Statistiques d'un utilisateur en une seule requête agrégée :
+        {'proposed': nombre d'activités créées, 'attending': nombre d'inscriptions}
+        """
+        return self.filter(models.Q(proposer=user) | models.Q(attendees=user)).aggregate(
+            proposed=models.Count('pk', filter=models.Q(proposer=user), distinct=True),
+            attending=models.Count('pk', filter=models.Q(attendees=user), distinct=True),
+        )
+
+
 # ------------------------------
 # Model Activity
 #------------------------------
@@ -190,8 +246,26 @@ class Activity(models.Model):
             on_delete=models.SET_NULL,
             null=True,
         )
+    capacity = models.PositiveIntegerField(
+            verbose_name="Nombre de places",
+            blank=True,
+            null=True,
+            help_text="Laisser vide pour un nombre de places illimité",
+        )
+    reserved_count = models.PositiveIntegerField(
+            verbose_name="Places réservées",
+            default=0,
+            editable=False,
+            help_text="Compteur maintenu par les réservations (voir services/reservations.py)",
+        )
+    updated_at = models.DateTimeField(
+            verbose_name="Dernière modification",
+            auto_now=True,
+            help_text="Mise à jour à chaque modification, y compris des participants (voir signals.py)",
+        )
     document = models.FileField(
             upload_to=document_upload_path,
+            storage=document_storage,
             blank=True,
             null=True,
             verbose_name="Document joint",
@@ -199,10 +273,19 @@ class Activity(models.Model):
             validators=[validate_file_extension, validate_file_size]
         )
 
+    objects = ActivityQuerySet.as_manager()
+
     class Meta:
         ordering = ['start_time']
         verbose_name = "Activité"
         verbose_name_plural = "Activités"
+        # Index correspondant aux requêtes des vues (start_time >= maintenant, trié par start_time)
+        indexes = [
+            models.Index(fields=['start_time', 'id'], name='activity_start_idx'),
+            models.Index(fields=['category', 'start_time'], name='activity_category_start_idx'),
+            models.Index(fields=['proposer', 'start_time'], name='activity_proposer_start_idx'),
+            models.Index(fields=['location_city', 'start_time'], name='activity_city_start_idx'),
+        ]
 
     # Validation personnalisée pour s'assurer que end_time est après start_time
     def clean(self):
@@ -236,8 +319,141 @@ class Activity(models.Model):
     def save(self, *args, **kwargs):
 
         self.clean()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # reserved_count n'est écrit que par services/reservations.py, sous verrou :
+            # ne pas écraser le compteur avec la valeur (peut-être périmée) de cette instance
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved_count'
+            ]
         super().save(*args, **kwargs)
 
 
     def get_absolute_url(self):
-        return reverse('activity_detail', kwargs={'pk': self.pk})
\ No newline at end of file
+        return reverse('activity_detail', kwargs={'pk': self.pk})
+
+    @property
+    def places_left(self):
+        """Nombre de places restantes, ou None si le nombre de places est illimité"""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.reserved_count, 0)
+
+    def sync_reserved_count(self):
+        """Recalcule le compteur de places réservées à partir des participants (ex. après une modification dans l'admin)"""
+        count = self.attendees.count()
+        Activity.objects.filter(pk=self.pk).update(reserved_count=count)
+        self.reserved_count = count
+
+
+# ------------------------------
+# Model WaitlistEntry
+#------------------------------
+class WaitlistEntry(models.Model):
+    """Inscription en liste d'attente pour une activité complète."""
+    activity = models.ForeignKey(
+        Activity,
+        on_delete=models.CASCADE,
+        related_name='waitlist',
+        verbose_name="Activité",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries',
+        verbose_name="Utilisateur",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Date d'inscription",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = "Inscription en liste d'attente"
+        verbose_name_plural = "Liste d'attente"
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'user'], name='unique_waitlist_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.activity.title}"
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+# ------------------------------
+# Model FeedToken
+#------------------------------
+class FeedToken(models.Model):
+    """Jeton secret donnant accès aux flux de calendrier personnels d'un utilisateur, sans session."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_token',
+        verbose_name="Utilisateur",
+    )
+    token = models.CharField(
+        verbose_name="Jeton",
+        max_length=64,
+        unique=True,
+        default=generate_feed_token,
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Date de création",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Jeton de flux"
+        verbose_name_plural = "Jetons de flux"
+
+    def __str__(self):
+        return f"Jeton de flux de {self.user}"
+
+    @classmethod
+    def for_user(cls, user):
+        token, _ = cls.objects.get_or_create(user=user)
+        return token
+
+    def regenerate(self):
+        """Remplace le jeton : les anciennes adresses d'abonnement cessent de fonctionner"""
+        self.token = generate_feed_token()
+        self.save(update_fields=['token'])
+
+
+# ------------------------------
+# Model DocumentBlob
+#------------------------------
+class DocumentBlob(models.Model):
+    """Contenu d'un document stocké une seule fois (storage.py), partagé par toutes les activités qui le joignent."""
+    name = models.CharField(
+        verbose_name="Chemin",
+        max_length=255,
+        unique=True,
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name="Taille (octets)",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Date de création",
+        auto_now_add=True,
+    )
+    last_used_at = models.DateTimeField(
+        verbose_name="Dernière utilisation",
+        default=timezone.now,
+        help_text="Renouvelée à chaque téléversement du même contenu",
+    )
+
+    class Meta:
+        verbose_name = "Contenu de document"
+        verbose_name_plural = "Contenus de documents"
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def unreferenced(cls):
+        """Contenus qu'aucune activité ne référence plus"""
+        return cls.objects.exclude(name__in=Activity.objects.filter(document__isnull=False).values('document'))
@@ -0,0 +1,91 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+
+# Génération des pages en cache : l'incrémenter rend toutes les pages en cache obsolètes
+GENERATION_KEY = "page:generation"
+
+
+def bump_generation(**kwargs):
+    """Invalide toutes les pages en cache ; utilisé comme récepteur des signaux d'Activity et de Category"""
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def _cache_key(request):
+    # Chaîne de requête normalisée : paramètres et valeurs triés, paramètres vides retirés
+    params = sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.GET.lists()
+    )
+    query = "&".join(f"{name}={','.join(values)}" for name, values in params if values)
+    digest = hashlib.md5(f"{request.path}?{query}".encode('utf-8')).hexdigest()
+    return f"page:{cache.get_or_set(GENERATION_KEY, 0, timeout=None)}:{digest}"
+
+
+def _is_cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # Les messages en attente doivent être affichés (et consommés) par un vrai rendu
+        and not len(messages.get_messages(request))
+    )
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # Une page contenant un jeton CSRF ne doit pas être partagée entre visiteurs
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _from_cache(request, entry):
+    content, headers = entry
+    response = HttpResponse(content, headers=headers)
+    # Le client a peut-être déjà cette version (ETag/Last-Modified posés par conditional.py)
+    last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+    not_modified = get_conditional_response(request, etag=response.get('ETag'), last_modified=last_modified)
+    if not_modified is None:
+        return response
+    for header in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+        if header in response:
+            not_modified[header] = response[header]
+    return not_modified
+
+
+def anonymous_page_cache(view):
+    """
+    Met en cache la réponse complète d'une vue publique pour les visiteurs non connectés,
+    par chemin et chaîne de requête normalisée, pendant PAGE_CACHE_TIMEOUT secondes.
+    Les utilisateurs connectés passent toujours par la vue.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        key = _cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            return _from_cache(request, entry)
+
+        response = view(request, *args, **kwargs)
+        if _is_cacheable_response(request, response):
+            # Seules les pages complètes (200) sont enregistrées, jamais un 304 propre à un client
+            cache.set(key, (response.content, dict(response.items())), timeout=settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
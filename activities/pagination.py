@@ -0,0 +1,82 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Levée lorsqu'un curseur de pagination ne peut pas être décodé"""
+
+
+def encode_cursor(activity):
+    """Encode la position (start_time, id) d'une activité dans un curseur opaque"""
+    raw = f"{activity.start_time.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Décode un curseur en (start_time, id). Lève InvalidCursor si le curseur est invalide."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        start_time, activity_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(activity_id)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor("Curseur de pagination invalide") from e
+
+
+class KeysetPage:
+    """Une page de résultats avec les curseurs vers les pages voisines"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def paginate_keyset(queryset, per_page, after=None, before=None):
+    """
+    Pagine un queryset d'activités par curseur sur (start_time, id).
+    Contrairement à OFFSET, chaque page ne lit que per_page + 1 lignes grâce à un filtre
+    sur la position de la page précédente : les pages profondes coûtent autant que la première.
+    """
+    if before:
+        start_time, activity_id = decode_cursor(before)
+        rows = list(
+            queryset.filter(Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=activity_id))
+            .order_by('-start_time', '-id')[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        return KeysetPage(
+            items,
+            next_cursor=encode_cursor(items[-1]) if items else before,
+            previous_cursor=encode_cursor(items[0]) if has_more else None,
+        )
+
+    if after:
+        start_time, activity_id = decode_cursor(after)
+        queryset = queryset.filter(Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=activity_id))
+
+    rows = list(queryset.order_by('start_time', 'id')[:per_page + 1])
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if has_more else None,
+        previous_cursor=(encode_cursor(items[0]) if items else after) if after else None,
+    )
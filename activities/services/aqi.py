@@ -1,42 +1,464 @@
 import os
-import urllib.request
+import http.client
+import urllib.parse
 import json
+import hashlib
+import logging
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
 
+from django.conf import settings
+from django.core.cache import cache
 
-def get_air_quality(city=None):
-    token = os.getenv("AQICN_TOKEN")
-    if not token:
-        raise ValueError("Le token AQICN n'est pas défini")
 
-    # Construire l'URL en fonction de la ville ou de la localisation actuelle
-    if city:
-        url = f'https://api.waqi.info/feed/{city}/?token={token}'
-    else:
-        url = f'https://api.waqi.info/feed/here/?token={token}'
+# Clés utilisées dans le cache Django
+CACHE_KEY_PREFIX = "aqi:city:"
+STATS_KEYS = {
+    'hits': "aqi:stats:hits",
+    'stale': "aqi:stats:stale",
+    'misses': "aqi:stats:misses",
+}
+
+logger = logging.getLogger(__name__)
+
+# Villes en cours de rafraîchissement en arrière-plan (évite les doublons)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Pool partagé et borné pour les rafraîchissements en arrière-plan
+_background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aqi-refresh")
+
+# Requêtes bloquantes en cours, par clé de cache (une seule requête vers l'API par ville)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class CircuitOpenError(ValueError):
+    """Levée lorsque le disjoncteur est ouvert : l'API n'est pas appelée"""
+
+
+class AQIClient:
+    """
+    Client HTTP pour l'API WAQI.
+    - réutilise les connexions keep-alive (pool de connexions HTTPS)
+    - délais séparés pour la connexion et la lecture
+    - disjoncteur : après N échecs consécutifs, l'API n'est plus appelée pendant un délai de refroidissement
+    """
+
+    HOST = "api.waqi.info"
+
+    def __init__(self, connect_timeout=2.0, read_timeout=5.0, pool_size=4,
+                 failure_threshold=5, cooldown=30.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_until = 0.0
+
+    # --- Pool de connexions ---
+
+    def _new_connection(self):
+        conn = http.client.HTTPSConnection(self.HOST, timeout=self.connect_timeout)
+        conn.connect()
+        # Une fois connecté, appliquer le délai de lecture
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Ferme toutes les connexions du pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # --- Disjoncteur ---
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_until > time.monotonic()
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_until = 0.0
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_until = time.monotonic() + self.cooldown
+
+    # --- Requêtes ---
+
+    def _get(self, path, fresh=False):
+        """
+        Effectue un GET et retourne (statut, raison, corps).
+        Si une connexion réutilisée a été fermée par le serveur, réessaie une fois avec une nouvelle connexion.
+        """
+        if fresh:
+            conn, reused = self._new_connection(), False
+        else:
+            conn, reused = self._acquire()
+        try:
+            conn.request("GET", path, headers={'Connection': 'keep-alive'})
+            response = conn.getresponse()
+            body = response.read()
+        except (socket.timeout, TimeoutError):
+            conn.close()
+            raise
+        except (OSError, http.client.HTTPException):
+            # ssl.SSLEOFError, BadStatusLine, CannotSendRequest, RemoteDisconnected...
+            conn.close()
+            if not reused:
+                raise
+            return self._get(path, fresh=True)
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return response.status, response.reason, body
+
+    def fetch(self, city=None):
+        """Interroge l'API WAQI. Lève ValueError avec les mêmes messages que l'ancienne implémentation."""
+        token = os.getenv("AQICN_TOKEN")
+        if not token:
+            raise ValueError("Le token AQICN n'est pas défini")
+
+        if self.is_open:
+            raise CircuitOpenError(
+                "Erreur de réseau lors de la récupération des données AQI: "
+                "service suspendu temporairement après plusieurs échecs consécutifs"
+            )
+
+        # Construire l'URL en fonction de la ville ou de la localisation actuelle
+        feed = urllib.parse.quote(city, safe='') if city else 'here'
+        path = f'/feed/{feed}/?token={urllib.parse.quote(token)}'
+
+        try:
+            try:
+                status, reason, body = self._get(path)
+            except (socket.timeout, TimeoutError) as e:
+                self._record_failure()
+                raise ValueError(f"Délai dépassé (timeout) lors de la récupération des données AQI: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                self._record_failure()
+                raise ValueError(f"Erreur de réseau lors de la récupération des données AQI: {e}") from e
+
+            if status == 404:
+                self._record_success()
+                raise ValueError("Ville non trouvée ou données indisponibles")
+            if status != 200:
+                if status >= 500:
+                    self._record_failure()
+                raise ValueError(f"Erreur HTTP lors de la récupération des données AQI: HTTP Error {status}: {reason}")
+
+            self._record_success()
+            data = json.loads(body)
+
+            # Vérifier le statut de la réponse
+            if data.get("status") != "ok":
+                error_message = data.get("data", "Erreur inconnue")
+                raise ValueError(f"Erreur API AQI: {error_message}")
+
+            # Vérifier si les données AQI sont disponibles (utile si la ville n'est pas trouvée)
+            if "data" not in data or "aqi" not in data["data"]:
+                raise ValueError("Données AQI non disponibles pour cette localisation ou ville")
+
+            return data
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Erreur de décodage JSON: {e}") from e
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Erreur inattendue lors de la récupération des données AQI: {e}") from e
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Retourne le client AQI partagé par le processus (créé à la première utilisation)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = AQIClient(
+                connect_timeout=settings.AQI_CONNECT_TIMEOUT,
+                read_timeout=settings.AQI_READ_TIMEOUT,
+                pool_size=settings.AQI_POOL_SIZE,
+                failure_threshold=settings.AQI_CIRCUIT_FAILURE_THRESHOLD,
+                cooldown=settings.AQI_CIRCUIT_COOLDOWN,
+            )
+        return _client
+
+
+def _fetch_air_quality(city=None):
+    """Interroge directement l'API WAQI, sans passer par le cache"""
+    return get_client().fetch(city)
+
+
+def _cache_key(city):
+    """Construit une clé de cache stable (et compatible memcached) pour une ville"""
+    normalized = (city or "here").strip().lower()
+    digest = hashlib.md5(normalized.encode("utf-8")).hexdigest()
+    return f"{CACHE_KEY_PREFIX}{digest}"
+
+
+def _is_negative_error(message):
+    """Indique si une erreur correspond à une ville inconnue (résultat négatif à mémoriser)"""
+    message = message.lower()
+    return (
+        "ville non trouvée" in message
+        or "unknown station" in message
+        or "not found" in message
+        or "données aqi non disponibles" in message
+    )
+
+
+def _incr_stat(name):
+    key = STATS_KEYS[name]
+    # add() ne fait rien si la clé existe déjà, incr() est atomique sur les backends qui le supportent
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    """Retourne les compteurs du cache AQI (hits, stale, misses) et le taux de succès"""
+    stats = {name: cache.get(key, 0) for name, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['stale'] + stats['misses']
+    stats['hit_rate'] = (stats['hits'] + stats['stale']) / total if total else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    """Remet les compteurs du cache AQI à zéro"""
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+def refresh_air_quality(city=None):
+    """
+    Récupère la qualité de l'air depuis l'API et met à jour le cache.
+    Les villes inconnues sont mémorisées pour une durée plus courte.
+    Les erreurs réseau ne sont pas mémorisées : une entrée périmée reste disponible.
+    """
+    key = _cache_key(city)
+    now = time.time()
+    try:
+        data = _fetch_air_quality(city)
+    except ValueError as e:
+        if _is_negative_error(str(e)):
+            ttl = settings.AQI_CACHE_NEGATIVE_TIMEOUT
+            cache.set(key, {'data': None, 'error': str(e), 'expires_at': now + ttl}, timeout=ttl)
+        raise
+
+    ttl = settings.AQI_CACHE_TIMEOUT
+    entry = {'data': data, 'error': None, 'expires_at': now + ttl}
+    # L'entrée reste dans le cache au-delà de son expiration pour pouvoir être servie périmée
+    cache.set(key, entry, timeout=ttl + settings.AQI_CACHE_STALE_TIMEOUT)
+    return data
+
+
+def _refresh_in_background(city):
+    """Planifie un rafraîchissement dans le pool partagé, une seule fois par ville"""
+    key = _cache_key(city)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def worker():
+        try:
+            refresh_air_quality(city)
+        except Exception:
+            logger.warning("Rafraîchissement AQI en arrière-plan échoué pour %s", city, exc_info=True)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _background_executor.submit(worker)
+
+
+def _refresh_single_flight(city):
+    """
+    Rafraîchit une ville de façon bloquante, avec une seule requête vers l'API par processus :
+    les requêtes concurrentes pour la même ville attendent le résultat de la première.
+    """
+    key = _cache_key(city)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        return future.result()
 
     try:
-        res = urllib.request.urlopen(url)
-        data = json.loads(res.read())
-
-        # Vérifier le statut de la réponse
-        if data.get("status") != "ok":
-            error_message = data.get("data", "Erreur inconnue")
-            raise ValueError(f"Erreur API AQI: {error_message}")
-
-        # Vérifier si les données AQI sont disponibles (utile si la ville n'est pas trouvée)
-        if "data" not in data or "aqi" not in data["data"]:
-            raise ValueError("Données AQI non disponibles pour cette localisation ou ville")
-
-        return data
-    except urllib.error.HTTPError as e:
-        if e.code == 404:
-            raise ValueError("Ville non trouvée ou données indisponibles") from e
+        future.set_result(refresh_air_quality(city))
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    return future.result()
+
+
+def _read_entry(entry):
+    """Retourne les données d'une entrée du cache ou relève l'erreur mémorisée"""
+    if entry['error']:
+        raise ValueError(entry['error'])
+    return entry['data']
+
+
+def get_air_quality(city=None):
+    """
+    Retourne la qualité de l'air d'une ville en passant par le cache Django.
+    - entrée fraîche : retournée directement
+    - entrée périmée : retournée immédiatement, rafraîchie en arrière-plan
+    - absence d'entrée : appel bloquant à l'API, partagé entre les requêtes concurrentes
+    Lève ValueError avec les mêmes messages que l'API en cas d'erreur.
+    """
+    entry = cache.get(_cache_key(city))
+
+    if entry is not None:
+        if entry['expires_at'] > time.time():
+            _incr_stat('hits')
         else:
-            raise ValueError(f"Erreur HTTP lors de la récupération des données AQI: {e}") from e
-    except urllib.error.URLError as e:
-        raise ValueError(f"Erreur de réseau lors de la récupération des données AQI: {e}") from e
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Erreur de décodage JSON: {e}") from e
-    except Exception as e:
-        raise ValueError(f"Erreur inattendue lors de la récupération des données AQI: {e}") from e
+            _incr_stat('stale')
+            _refresh_in_background(city)
+        return _read_entry(entry)
+
+    _incr_stat('misses')
+    return _refresh_single_flight(city)
+
+
+def refresh_many(cities, max_workers=4):
+    """
+    Rafraîchit la qualité de l'air de plusieurs villes en parallèle (pool de threads borné).
+    Les villes équivalentes (même clé de cache) ne sont interrogées qu'une fois.
+    Retourne un dictionnaire {ville: None si succès, message d'erreur sinon}.
+    """
+    unique = {}
+    for city in cities:
+        unique.setdefault(_cache_key(city), city)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aqi-prewarm") as executor:
+        futures = {executor.submit(refresh_air_quality, city): city for city in unique.values()}
+        for future in as_completed(futures):
+            city = futures[future]
+            try:
+                future.result()
+                results[city] = None
+            except Exception as e:
+                results[city] = str(e)
+    return results
+
+
+def describe_aqi(aqi_value):
+    """Retourne le niveau, la couleur et la description associés à un indice AQI"""
+    if aqi_value <= 50:
+        return {
+            'level': 'Bon',
+            'color': 'success',
+            'description': 'Qualité de l\'air excellente, idéale pour les activités extérieures'
+        }
+    if aqi_value <= 100:
+        return {
+            'level': 'Modéré',
+            'color': 'warning',
+            'description': 'Qualité de l\'air acceptable, mais certaines personnes sensibles pourraient ressentir des effets'
+        }
+    if aqi_value <= 150:
+        return {
+            'level': 'Mauvais pour les sensibles',
+            'color': 'orange',
+            'description': 'Les personnes sensibles devraient réduire les activités prolongées à l\'extérieur'
+        }
+    if aqi_value <= 200:
+        return {
+            'level': 'Mauvais',
+            'color': 'danger',
+            'description': 'Tout le monde pourrait commencer à ressentir des effets sur la santé; les personnes sensibles devraient éviter les activités extérieures'
+        }
+    if aqi_value <= 300:
+        return {
+            'level': 'Très mauvais',
+            'color': 'dark',
+            'description': 'Aucune activité extérieure recommandée pour tout le monde'
+        }
+    return {
+        'level': 'Dangereux',
+        'color': 'black',
+        'description': 'Aucune activité extérieure recommandée pour tout le monde'
+    }
+
+
+# Pool partagé pour les recherches concurrentes des pages de liste
+_lookup_executor = ThreadPoolExecutor(max_workers=settings.AQI_BADGE_WORKERS, thread_name_prefix="aqi-lookup")
+
+
+def get_air_quality_badges(cities, deadline=None):
+    """
+    Résout la qualité de l'air de plusieurs villes en parallèle, avec un délai global.
+    Retourne {clé de ville: badge} où badge['status'] vaut :
+    - 'ok' : valeur disponible (avec 'aqi', 'level', 'color')
+    - 'pending' : la recherche n'a pas abouti avant le délai (elle continue et remplira le cache)
+    - 'unavailable' : la ville est inconnue ou le service est en erreur
+    Les clés sont obtenues avec city_key().
+    """
+    if deadline is None:
+        deadline = settings.AQI_BADGE_DEADLINE
+
+    futures = {}
+    for city in cities:
+        key = city_key(city)
+        if key not in futures:
+            futures[key] = _lookup_executor.submit(get_air_quality, city)
+
+    wait(futures.values(), timeout=deadline)
+
+    badges = {}
+    for key, future in futures.items():
+        if not future.done():
+            badges[key] = {'status': 'pending'}
+            continue
+        try:
+            aqi_value = future.result()["data"]["aqi"]
+            badges[key] = {'status': 'ok', 'aqi': aqi_value, **describe_aqi(aqi_value)}
+        except Exception:
+            badges[key] = {'status': 'unavailable'}
+    return badges
+
 
+def city_key(city):
+    """Normalise un nom de ville comme les clés du cache AQI (espaces, casse)"""
+    return (city or "").strip().lower()
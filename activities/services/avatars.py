@@ -0,0 +1,121 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from ..models import User
+
+
+# Tailles (en pixels, carrées) des variantes générées pour chaque avatar
+AVATAR_SIZES = (32, 96, 256)
+
+# Formats des variantes : WebP en priorité, JPEG pour les navigateurs qui ne le lisent pas
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+logger = logging.getLogger(__name__)
+
+# Les variantes sont générées hors du cycle de la requête, une à la fois
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="avatar-variants")
+
+
+def variant_name(avatar_name, size, fmt):
+    """avatars/3/avatar_bob.png -> avatars/3/variants/avatar_bob_96.webp"""
+    directory, filename = posixpath.split(avatar_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f"{stem}_{size}.{fmt}")
+
+
+def variant_url(user, size, fmt='webp'):
+    """
+    URL de la variante la plus proche de la taille demandée,
+    ou de l'image d'origine tant que les variantes ne sont pas prêtes.
+    """
+    if not user.avatar:
+        return None
+    if user.avatar_variants_for != user.avatar.name:
+        return user.avatar.url
+    size = next((candidate for candidate in AVATAR_SIZES if candidate >= size), AVATAR_SIZES[-1])
+    return default_storage.url(variant_name(user.avatar.name, size, fmt))
+
+
+def _encode(image, size, fmt):
+    variant = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+    if fmt == 'jpg' and variant.mode != 'RGB':
+        # JPEG n'a pas de transparence : fond blanc
+        background = Image.new('RGB', variant.size, (255, 255, 255))
+        background.paste(variant, mask=variant.getchannel('A') if 'A' in variant.getbands() else None)
+        variant = background
+    buffer = io.BytesIO()
+    # Aucune métadonnée (EXIF, ICC, XMP) n'est transmise à l'encodeur
+    variant.save(buffer, **FORMATS[fmt])
+    return ContentFile(buffer.getvalue())
+
+
+def delete_variants(avatar_name):
+    for size in AVATAR_SIZES:
+        for fmt in FORMATS:
+            name = variant_name(avatar_name, size, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def generate_variants(user_id, avatar_name, previous_name=''):
+    """
+    Génère les variantes redimensionnées d'un avatar, les déclare prêtes puis supprime
+    celles de l'avatar précédent. Les variantes ne sont déclarées prêtes que si l'avatar
+    n'a pas changé entre-temps (une autre génération est alors déjà planifiée).
+    """
+    with default_storage.open(avatar_name, 'rb') as source:
+        image = Image.open(source)
+        # Appliquer l'orientation EXIF avant de la retirer avec les autres métadonnées
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+        for size in AVATAR_SIZES:
+            for fmt in FORMATS:
+                name = variant_name(avatar_name, size, fmt)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, _encode(image, size, fmt))
+
+    # pylint: disable=no-member
+    User.objects.filter(pk=user_id, avatar=avatar_name).update(avatar_variants_for=avatar_name)
+
+    if previous_name and previous_name != avatar_name:
+        delete_variants(previous_name)
+
+
+def _run(user_id, avatar_name, previous_name):
+    try:
+        if avatar_name:
+            generate_variants(user_id, avatar_name, previous_name)
+        else:
+            delete_variants(previous_name)
+            User.objects.filter(pk=user_id).update(avatar_variants_for='')
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Échec de la génération des variantes de l'avatar %s", avatar_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(sender, instance, **kwargs):
+    """
+    Récepteur post_save de User : planifie la génération des variantes si l'avatar a changé.
+    Le travail démarre après la validation de la transaction, dans un thread d'arrière-plan.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and 'avatar' not in update_fields:
+        return
+    avatar_name = instance.avatar.name if instance.avatar else ''
+    if avatar_name == instance.avatar_variants_for:
+        return
+    previous_name = instance.avatar_variants_for
+    transaction.on_commit(lambda: _executor.submit(_run, instance.pk, avatar_name, previous_name))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Category
+
+
+# Registre des catégories mis en cache, invalidé par les signaux de Category (voir signals.py).
+# La durée reste finie : avec un cache local, les autres processus ne voient pas l'invalidation.
+CACHE_KEY = "categories:registry"
+
+
+def _load_registry():
+    # pylint: disable=no-member
+    categories = tuple(Category.objects.order_by('name').values_list('id', 'name'))
+    return {
+        'categories': categories,
+        'names': frozenset(name for _, name in categories),
+    }
+
+
+def get_registry():
+    """Retourne le registre des catégories : {'categories': ((id, nom), ...), 'names': frozenset}"""
+    return cache.get_or_set(CACHE_KEY, _load_registry, timeout=settings.CATEGORY_REGISTRY_TIMEOUT)
+
+
+def invalidate_registry(**kwargs):
+    """Vide le registre ; utilisé comme récepteur des signaux post_save/post_delete de Category"""
+    cache.delete(CACHE_KEY)
+
+
+def category_names():
+    """Noms des catégories, triés"""
+    return [name for _, name in get_registry()['categories']]
+
+
+def is_valid_category(name):
+    """Vérifie en O(1) qu'une catégorie existe"""
+    return name in get_registry()['names']
+
+
+def search_choices():
+    """Choix du filtre de catégorie de la liste des activités"""
+    return [('all', 'Toutes les activités')] + [(name, name) for name in category_names()]
+
+
+def model_choices():
+    """Choix (id, nom) pour un ModelChoiceField sur Category"""
+    return [('', '---------')] + list(get_registry()['categories'])
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+
+# Périodes proposées par le filtre de date de la liste des activités
+THIS_WEEK = 'week'
+WEEKEND = 'weekend'
+CUSTOM = 'custom'
+DATE_RANGE_CHOICES = [
+    ('', 'Toutes les dates'),
+    (THIS_WEEK, 'Cette semaine'),
+    (WEEKEND, 'Ce week-end'),
+    (CUSTOM, 'Période personnalisée'),
+]
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_range(when, date_from=None, date_to=None, now=None):
+    """
+    Retourne l'intervalle [début, fin[ correspondant à une période du filtre de date
+    (heure locale), ou (None, None) si aucune période n'est choisie.
+    """
+    now = timezone.localtime(now)
+    today = now.date()
+
+    if when == THIS_WEEK:
+        # Jusqu'à la fin du dimanche
+        return now, _start_of_day(today + timedelta(days=7 - today.weekday()))
+    if when == WEEKEND:
+        # Samedi 0 h au lundi 0 h ; pendant le week-end, à partir de maintenant
+        saturday = today + timedelta(days=5 - today.weekday())
+        return max(now, _start_of_day(saturday)), _start_of_day(saturday + timedelta(days=2))
+    if when == CUSTOM:
+        start = _start_of_day(date_from) if date_from else None
+        end = _start_of_day(date_to + timedelta(days=1)) if date_to else None
+        return start, end
+    return None, None
+
+
+def filter_date_range(queryset, when, date_from=None, date_to=None):
+    start, end = date_range(when, date_from, date_to)
+    if start:
+        queryset = queryset.filter(start_time__gte=start)
+    if end:
+        queryset = queryset.filter(start_time__lt=end)
+    return queryset
+
+
+def _cache_key(cache_params):
+    raw = json.dumps(cache_params, sort_keys=True, default=str)
+    return "facets:" + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _load_counts(queryset):
+    # Une seule requête GROUP BY (catégorie, ville) sur l'ensemble filtré
+    return [
+        (row['category__name'], row['location_city'], row['total'])
+        for row in queryset.order_by().values('category__name', 'location_city').annotate(total=Count('id'))
+    ]
+
+
+def facet_counts(queryset, cache_params, selected_categories=(), selected_cities=()):
+    """
+    Compte les activités par catégorie et par ville pour le panneau de filtres.
+
+    queryset est l'ensemble filtré par tout sauf les catégories et villes choisies :
+    le nombre affiché pour une catégorie tient compte des villes choisies et inversement,
+    comme pour des filtres à choix multiples. Les comptes (catégorie, ville) viennent d'une
+    seule requête mise en cache FACET_CACHE_TIMEOUT secondes, clé dérivée de cache_params.
+    """
+    rows = cache.get_or_set(
+        _cache_key(cache_params), lambda: _load_counts(queryset), timeout=settings.FACET_CACHE_TIMEOUT
+    )
+
+    categories, cities = {}, {}
+    for category, city, total in rows:
+        if category is None:
+            continue
+        if not selected_cities or city in selected_cities:
+            categories[category] = categories.get(category, 0) + total
+        if not selected_categories or category in selected_categories:
+            cities[city] = cities.get(city, 0) + total
+
+    # Les valeurs choisies restent affichées même si elles n'ont plus de résultat
+    for category in selected_categories:
+        categories.setdefault(category, 0)
+    for city in selected_cities:
+        cities.setdefault(city, 0)
+
+    return {
+        'categories': sorted(categories.items()),
+        'cities': sorted(cities.items(), key=lambda item: item[0].lower()),
+    }
@@ -0,0 +1,135 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+
+
+# Corps des cartes d'activité mis en cache, par variante d'affichage
+CARD_TEMPLATES = {
+    'home': "partials/cards/_home_body.html",
+    'list': "partials/cards/_list_body.html",
+    'proposed': "partials/cards/_proposed_body.html",
+    'attending': "partials/cards/_attending_body.html",
+    # Listes complètes (repliées) du profil
+    'full': "partials/cards/_full_body.html",
+}
+
+STATS_KEYS = {
+    'hits': "activity-card:stats:hits",
+    'misses': "activity-card:stats:misses",
+}
+
+
+def _version_key(kind, pk):
+    return f"activity-card:version:{kind}:{pk}"
+
+
+def _versions(activity):
+    """
+    Compteurs de modification de l'activité, de sa catégorie et de son organisateur, lus en
+    un seul aller-retour. Un compteur absent (jamais incrémenté ou évincé) est initialisé avec
+    l'heure courante : il ne peut pas retomber sur une valeur déjà utilisée par un fragment
+    encore en cache.
+    """
+    keys = [
+        _version_key('activity', activity.pk),
+        _version_key('category', activity.category_id),
+        _version_key('user', activity.proposer_id),
+    ]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Cas rare (premier affichage, éviction) : add() garde la valeur d'un processus concurrent
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def _bump(kind, pk):
+    key = _version_key(kind, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_activity(pk):
+    _bump('activity', pk)
+
+
+def bump_category(pk):
+    _bump('category', pk)
+
+
+def bump_user(pk):
+    _bump('user', pk)
+
+
+# Compteurs de succès / échecs accumulés dans le processus, reportés dans le cache par lots :
+# pas d'aller-retour supplémentaire pour chaque carte affichée
+STATS_FLUSH_EVERY = 100
+_pending_stats = {name: 0 for name in STATS_KEYS}
+_pending_lock = threading.Lock()
+
+
+def _flush_stats():
+    with _pending_lock:
+        pending = {name: count for name, count in _pending_stats.items() if count}
+        for name in pending:
+            _pending_stats[name] = 0
+    for name, count in pending.items():
+        key = STATS_KEYS[name]
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, timeout=None)
+
+
+def _incr_stat(name):
+    with _pending_lock:
+        _pending_stats[name] += 1
+        should_flush = sum(_pending_stats.values()) >= STATS_FLUSH_EVERY
+    if should_flush:
+        _flush_stats()
+
+
+def get_fragment_stats():
+    """Retourne les compteurs du cache des cartes (hits, misses) et le taux de succès"""
+    _flush_stats()
+    stats = {name: cache.get(key, 0) for name, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_fragment_stats():
+    """Remet les compteurs du cache des cartes à zéro"""
+    with _pending_lock:
+        for name in _pending_stats:
+            _pending_stats[name] = 0
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+def render_card_body(activity, variant='list'):
+    """
+    Rend le corps d'une carte d'activité, mis en cache par (variante, id, compteurs, langue).
+    Le fragment ne doit dépendre ni de l'utilisateur connecté ni de l'heure courante.
+    """
+    versions = _versions(activity)
+    key = "activity-card:{}:{}:{}:{}".format(
+        variant, activity.pk, ".".join(str(version) for version in versions), translation.get_language()
+    )
+    html = cache.get(key)
+    if html is not None:
+        _incr_stat('hits')
+        return html
+
+    _incr_stat('misses')
+    html = render_to_string(CARD_TEMPLATES[variant], {'activity': activity})
+    cache.set(key, html, timeout=settings.ACTIVITY_CARD_CACHE_TIMEOUT)
+    return html
@@ -0,0 +1,64 @@
+"""
+Limitation des tentatives de connexion échouées, par compte et par adresse IP.
+
+Le contrôle a lieu avant authenticate() : une fois la limite atteinte, plus aucun hachage de
+mot de passe (PBKDF2, volontairement lent) n'est calculé pour ce compte ou cette adresse
+jusqu'à la fin de la fenêtre. Les compteurs sont dans le cache et expirent d'eux-mêmes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _account_key(username):
+    # Insensible à la casse : « Bob » et « bob » partagent le même compteur
+    digest = hashlib.md5(username.strip().lower().encode('utf-8')).hexdigest()
+    return f"login:failures:account:{digest}"
+
+
+def _ip_key(ip):
+    return f"login:failures:ip:{ip}"
+
+
+def client_ip(request):
+    """
+    Adresse du client. REMOTE_ADDR seulement : X-Forwarded-For peut être forgé par le client
+    (derrière un proxy inverse, c'est au proxy de renseigner REMOTE_ADDR).
+    """
+    return request.META.get('REMOTE_ADDR') or 'inconnue'
+
+
+def _keys(username, ip):
+    keys = {}
+    if username:
+        keys[_account_key(username)] = settings.LOGIN_MAX_FAILURES_PER_ACCOUNT
+    if ip:
+        keys[_ip_key(ip)] = settings.LOGIN_MAX_FAILURES_PER_IP
+    return keys
+
+
+def is_throttled(username, ip):
+    """Vrai si le compte ou l'adresse a atteint sa limite d'échecs"""
+    keys = _keys(username, ip)
+    counts = cache.get_many(list(keys))
+    return any(counts.get(key, 0) >= limit for key, limit in keys.items())
+
+
+def record_failure(username, ip):
+    """Compte un échec ; la fenêtre démarre au premier échec et dure LOGIN_THROTTLE_WINDOW secondes"""
+    for key in _keys(username, ip):
+        cache.add(key, 0, timeout=settings.LOGIN_THROTTLE_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # La clé a expiré entre add() et incr()
+            cache.set(key, 1, timeout=settings.LOGIN_THROTTLE_WINDOW)
+
+
+def record_success(username):
+    """
+    Remet à zéro le compteur du compte. Celui de l'adresse est conservé : sinon, un attaquant
+    possédant un compte valide pourrait effacer ses échecs en s'y connectant.
+    """
+    cache.delete(_account_key(username))
@@ -0,0 +1,124 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from ..models import Activity, WaitlistEntry
+
+
+# Résultats possibles d'une réservation ou d'une annulation
+RESERVED = 'reserved'
+WAITLISTED = 'waitlisted'
+ALREADY_RESERVED = 'already_reserved'
+ALREADY_WAITLISTED = 'already_waitlisted'
+CANCELLED = 'cancelled'
+LEFT_WAITLIST = 'left_waitlist'
+NOT_REGISTERED = 'not_registered'
+
+
+def _lock_activity(activity_id):
+    """
+    Verrouille la ligne de l'activité par une écriture neutre.
+    Fonctionne sur PostgreSQL (verrou de ligne) comme sur SQLite (verrou d'écriture de la base) :
+    toutes les réservations et annulations d'une même activité sont ainsi sérialisées.
+    """
+    return Activity.objects.filter(pk=activity_id).update(reserved_count=F('reserved_count'))
+
+
+def reserve(activity, user):
+    """
+    Réserve une place pour l'utilisateur, ou l'inscrit en liste d'attente si l'activité est complète
+    ou si d'autres personnes attendent déjà (elles passent en premier).
+    Le choix est fait sous le verrou de l'activité : deux requêtes concurrentes, ou une réservation
+    et une annulation, ne peuvent pas se croiser.
+    """
+    if activity.attendees.filter(pk=user.pk).exists():
+        return ALREADY_RESERVED
+
+    try:
+        with transaction.atomic():
+            _lock_activity(activity.pk)
+            # Revérifier sous le verrou : une requête concurrente a pu inscrire l'utilisateur
+            if activity.attendees.filter(pk=user.pk).exists():
+                return ALREADY_RESERVED
+
+            reserved_count, capacity = Activity.objects.values_list('reserved_count', 'capacity').get(pk=activity.pk)
+            has_free_place = capacity is None or reserved_count < capacity
+            others_waiting = WaitlistEntry.objects.filter(activity=activity).exclude(user=user).exists()
+            if has_free_place and not others_waiting:
+                Activity.objects.filter(pk=activity.pk).update(reserved_count=F('reserved_count') + 1)
+                activity.attendees.add(user)
+                WaitlistEntry.objects.filter(activity=activity, user=user).delete()
+                return RESERVED
+
+            _, created = WaitlistEntry.objects.get_or_create(activity=activity, user=user)
+            return WAITLISTED if created else ALREADY_WAITLISTED
+    except IntegrityError:
+        # Inscription concurrente du même utilisateur en liste d'attente
+        return ALREADY_WAITLISTED
+
+
+def promote_waitlist(activity_id):
+    """
+    Donne les places libres aux premières personnes de la liste d'attente.
+    Appelée dès que des places peuvent se libérer : annulation, hausse de la capacité,
+    participants modifiés dans l'admin, suppression d'un utilisateur.
+    Retourne la liste des utilisateurs promus.
+    """
+    with transaction.atomic():
+        _lock_activity(activity_id)
+        reserved_count, capacity = Activity.objects.values_list('reserved_count', 'capacity').get(pk=activity_id)
+        entries = (
+            WaitlistEntry.objects.select_for_update(of=('self',))
+            .filter(activity_id=activity_id)
+            .select_related('user')
+            .order_by('created_at', 'id')
+        )
+        if capacity is not None:
+            if reserved_count >= capacity:
+                return []
+            entries = entries[:capacity - reserved_count]
+        entries = list(entries)
+        if not entries:
+            return []
+
+        promoted = [entry.user for entry in entries]
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+        Activity.objects.get(pk=activity_id).attendees.add(*promoted)
+        Activity.objects.filter(pk=activity_id).update(reserved_count=F('reserved_count') + len(promoted))
+        return promoted
+
+
+def cancel(activity, user):
+    """
+    Annule la réservation (ou l'inscription en liste d'attente) de l'utilisateur.
+    Si une place se libère, la première personne de la liste d'attente la reçoit automatiquement.
+    Retourne (résultat, utilisateur promu ou None).
+    """
+    with transaction.atomic():
+        _lock_activity(activity.pk)
+
+        if not activity.attendees.filter(pk=user.pk).exists():
+            deleted, _ = WaitlistEntry.objects.filter(activity=activity, user=user).delete()
+            return (LEFT_WAITLIST if deleted else NOT_REGISTERED), None
+
+        activity.attendees.remove(user)
+        Activity.objects.filter(pk=activity.pk, reserved_count__gt=0).update(
+            reserved_count=F('reserved_count') - 1
+        )
+        # La capacité a pu être réduite entre-temps : promote_waitlist ne dépasse jamais la capacité
+        promoted = promote_waitlist(activity.pk)
+        return CANCELLED, (promoted[0] if promoted else None)
+
+
+def release_user(user):
+    """
+    Libère les places d'un utilisateur sur le point d'être supprimé : la suppression en cascade
+    des participants ne déclenche pas m2m_changed et laisserait les compteurs trop hauts.
+    """
+    # pylint: disable=no-member
+    for activity in Activity.objects.filter(attendees=user).only('pk'):
+        cancel(activity, user)
+
+
+def is_waitlisted(activity, user):
+    """Indique si l'utilisateur est en liste d'attente pour l'activité"""
+    return WaitlistEntry.objects.filter(activity=activity, user=user).exists()
@@ -0,0 +1,148 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+
+# Table FTS5 (SQLite) et colonne tsvector (PostgreSQL) créées par la migration 0004_activity_search
+FTS_TABLE = "activities_activity_fts"
+TSVECTOR_COLUMN = "search_vector"
+
+# Suffixes retirés par la racinisation légère du français (du plus long au plus court)
+FRENCH_SUFFIXES = (
+    'issements', 'issement', 'atrices', 'atrice', 'ateurs', 'ateur', 'ations', 'ation',
+    'ements', 'ement', 'ances', 'ance', 'ences', 'ence', 'ables', 'able', 'iques', 'ique',
+    'euses', 'euse', 'ments', 'ment', 'ives', 'ive', 'eurs', 'eur', 'ites', 'ite',
+    'es', 'e', 's', 'x',
+)
+MIN_STEM_LENGTH = 3
+
+# Nombre d'activités lues puis indexées à la fois par rebuild_index
+REBUILD_BATCH_SIZE = 1000
+
+
+def fold_accents(text):
+    """Met en minuscules et retire les accents (« Randonnée » -> « randonnee »)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(word):
+    """Racinisation légère du français : retire le suffixe le plus long en gardant une racine suffisante"""
+    for suffix in FRENCH_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Découpe un texte en racines sans accents"""
+    return [stem(token) for token in re.findall(r'\w+', fold_accents(text or ''))]
+
+
+def index_text(text):
+    return ' '.join(tokenize(text))
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+# --- SQLite : table FTS5 maintenue par les signaux de Activity ---
+
+def index_activity(activity):
+    """Ajoute ou met à jour une activité dans la table FTS5 (récepteur post_save)"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [activity.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, location_city) VALUES (%s, %s, %s, %s)",
+            [activity.pk, index_text(activity.title), index_text(activity.description),
+             index_text(activity.location_city)],
+        )
+
+
+def unindex_activity(activity_id):
+    """Retire une activité de la table FTS5 (récepteur post_delete)"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [activity_id])
+
+
+def rebuild_index(schema_connection=None):
+    """
+    Reconstruit entièrement la table FTS5 (migration, import en masse avec bulk_create).
+    Les activités sont lues par lots de REBUILD_BATCH_SIZE, dans l'ordre des clés : la
+    mémoire utilisée ne dépend pas de la taille de la table.
+    """
+    conn = schema_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        last_pk = 0
+        while True:
+            cursor.execute(
+                "SELECT id, title, description, location_city FROM activities_activity"
+                " WHERE id > %s ORDER BY id LIMIT %s",
+                [last_pk, REBUILD_BATCH_SIZE],
+            )
+            rows = [
+                (pk, index_text(title), index_text(description), index_text(city))
+                for pk, title, description, city in cursor.fetchall()
+            ]
+            if not rows:
+                break
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, location_city) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+            last_pk = rows[-1][0]
+
+
+def _fts_match(query):
+    """Construit une requête MATCH FTS5 : chaque racine doit apparaître (recherche par préfixe)"""
+    return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+
+# --- Recherche ---
+
+def search_activities(queryset, query, ranked=True):
+    """
+    Filtre un queryset d'activités par recherche plein texte sur le titre, la description et la ville.
+    Avec ranked=True, ajoute search_rank et trie par pertinence (titre > ville > description).
+    """
+    if not tokenize(query):
+        return queryset.none()
+
+    if connection.vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('french', activities_unaccent(%s))"
+        queryset = queryset.filter(
+            RawSQL(f"activities_activity.{TSVECTOR_COLUMN} @@ {tsquery}", [query], output_field=BooleanField())
+        )
+        if ranked:
+            queryset = queryset.annotate(
+                search_rank=RawSQL(
+                    f"ts_rank(activities_activity.{TSVECTOR_COLUMN}, {tsquery})", [query], output_field=FloatField()
+                ),
+            ).order_by('-search_rank', 'start_time', 'id')
+        return queryset
+
+    # Le MATCH est évalué une seule fois, dans la sous-requête sur la table FTS5
+    match = _fts_match(query)
+    queryset = queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    if ranked:
+        # bm25 : plus la valeur est basse, plus le résultat est pertinent ; calculé seulement
+        # pour les activités retenues par le filtre
+        queryset = queryset.annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}, 10.0, 1.0, 5.0) FROM {FTS_TABLE}"
+                f" WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = activities_activity.id",
+                [match], output_field=FloatField(),
+            ),
+        ).order_by('search_rank', 'start_time', 'id')
+    return queryset
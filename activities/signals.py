@@ -0,0 +1,120 @@
+from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+from .models import Activity, Category, User, WaitlistEntry
+from .page_cache import bump_generation
+from .services import avatars, fragments, reservations, search
+from .services.categories import invalidate_registry
+
+
+def index_activity(sender, instance, **kwargs):
+    """Maintient l'index plein texte à jour après l'enregistrement d'une activité"""
+    search.index_activity(instance)
+
+
+def unindex_activity(sender, instance, **kwargs):
+    search.unindex_activity(instance.pk)
+
+
+def invalidate_activity_card(sender, instance, **kwargs):
+    fragments.bump_activity(instance.pk)
+
+
+def invalidate_category_cards(sender, instance, **kwargs):
+    fragments.bump_category(instance.pk)
+
+
+def invalidate_user_cards(sender, instance, **kwargs):
+    fragments.bump_user(instance.pk)
+
+
+def touch_attendee_activities(sender, instance, action, reverse, pk_set, **kwargs):
+    """Un changement de participants modifie l'activité : mettre à jour updated_at (validateurs HTTP)"""
+    if not reverse:
+        if action.startswith('post_'):
+            Activity.objects.filter(pk=instance.pk).touch()
+    elif action == 'pre_clear':
+        instance.attended_activities.touch()
+    elif action in ('post_add', 'post_remove'):
+        Activity.objects.filter(pk__in=pk_set).touch()
+
+
+def touch_waitlist_activity(sender, instance, **kwargs):
+    Activity.objects.filter(pk=instance.activity_id).touch()
+
+
+def touch_category_activities(sender, instance, **kwargs):
+    Activity.objects.filter(category_id=instance.pk).touch()
+
+
+def touch_user_activities(sender, instance, created=False, update_fields=None, **kwargs):
+    """Le nom d'un organisateur ou d'un participant est affiché sur les pages d'activité"""
+    if created:
+        return
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        # Connexion ou changement de mot de passe : rien d'affiché n'a changé
+        return
+    Activity.objects.filter(models.Q(proposer=instance) | models.Q(attendees=instance)).touch()
+
+
+def invalidate_attendee_cards(sender, instance, action, reverse, pk_set, **kwargs):
+    """Le nombre de participants fait partie de la carte : invalider les activités concernées"""
+    if not reverse:
+        if action.startswith('post_'):
+            fragments.bump_activity(instance.pk)
+    elif action == 'pre_clear':
+        # user.attended_activities.clear() : pk_set n'est pas fourni, lire les activités avant suppression
+        for activity_id in instance.attended_activities.values_list('pk', flat=True):
+            fragments.bump_activity(activity_id)
+    elif action in ('post_add', 'post_remove'):
+        for activity_id in pk_set:
+            fragments.bump_activity(activity_id)
+
+
+def promote_after_capacity_change(sender, instance, created=False, update_fields=None, **kwargs):
+    """Une hausse de capacité libère des places : elles reviennent d'abord à la liste d'attente"""
+    if created or (update_fields and 'capacity' not in update_fields):
+        return
+    reservations.promote_waitlist(instance.pk)
+
+
+def release_user_reservations(sender, instance, **kwargs):
+    reservations.release_user(instance)
+
+
+def connect_signals():
+    """Connecte les récepteurs de signaux de l'application (appelé par ActivitiesConfig.ready)"""
+    post_save.connect(invalidate_registry, sender=Category, dispatch_uid='categories_registry_save')
+    post_delete.connect(invalidate_registry, sender=Category, dispatch_uid='categories_registry_delete')
+    post_save.connect(index_activity, sender=Activity, dispatch_uid='activity_search_index')
+    post_delete.connect(unindex_activity, sender=Activity, dispatch_uid='activity_search_unindex')
+
+    # Cache des cartes d'activité (services/fragments.py)
+    post_save.connect(invalidate_activity_card, sender=Activity, dispatch_uid='activity_card_save')
+    pre_delete.connect(invalidate_activity_card, sender=Activity, dispatch_uid='activity_card_delete')
+    m2m_changed.connect(invalidate_attendee_cards, sender=Activity.attendees.through,
+                        dispatch_uid='activity_card_attendees')
+    post_save.connect(invalidate_category_cards, sender=Category, dispatch_uid='activity_card_category_save')
+    post_delete.connect(invalidate_category_cards, sender=Category, dispatch_uid='activity_card_category_delete')
+    post_save.connect(invalidate_user_cards, sender=User, dispatch_uid='activity_card_user_save')
+
+    # Pages publiques en cache pour les visiteurs anonymes (page_cache.py)
+    post_save.connect(bump_generation, sender=Activity, dispatch_uid='page_cache_activity_save')
+    post_delete.connect(bump_generation, sender=Activity, dispatch_uid='page_cache_activity_delete')
+    post_save.connect(bump_generation, sender=Category, dispatch_uid='page_cache_category_save')
+    post_delete.connect(bump_generation, sender=Category, dispatch_uid='page_cache_category_delete')
+
+    # Réservations : compteur de places et liste d'attente (services/reservations.py)
+    post_save.connect(promote_after_capacity_change, sender=Activity, dispatch_uid='reservations_capacity')
+    pre_delete.connect(release_user_reservations, sender=User, dispatch_uid='reservations_user_delete')
+
+    # Variantes redimensionnées des avatars, générées en arrière-plan
+    post_save.connect(avatars.schedule_variants, sender=User, dispatch_uid='user_avatar_variants')
+
+    # Date de dernière modification des activités (Activity.updated_at)
+    m2m_changed.connect(touch_attendee_activities, sender=Activity.attendees.through,
+                        dispatch_uid='activity_touch_attendees')
+    post_save.connect(touch_waitlist_activity, sender=WaitlistEntry, dispatch_uid='activity_touch_waitlist_save')
+    post_delete.connect(touch_waitlist_activity, sender=WaitlistEntry, dispatch_uid='activity_touch_waitlist_delete')
+    post_save.connect(touch_category_activities, sender=Category, dispatch_uid='activity_touch_category')
+    post_save.connect(touch_user_activities, sender=User, dispatch_uid='activity_touch_user')
@@ -0,0 +1,191 @@
+"""
+Stockage adressé par contenu des documents d'activité.
+
+Le nom d'un fichier est l'empreinte SHA-256 de son contenu, répartie sur deux niveaux de
+sous-dossiers (documents/ab/cd/abcd….pdf) : un même document téléversé pour plusieurs
+activités n'est stocké qu'une fois, et chaque dossier reste petit (65 536 dossiers feuilles,
+soit environ 150 fichiers par dossier pour dix millions de documents).
+
+Chaque contenu stocké est enregistré dans DocumentBlob ; les contenus qui ne sont plus
+référencés par aucune activité sont supprimés par la commande gc_documents.
+
+Les fichiers statiques sont eux aussi nommés d'après leur contenu (style.3f2a9c….css) par
+CompressedManifestStaticFilesStorage, qui écrit en plus leurs variantes gzip et brotli
+lors de collectstatic (servies par media.serve_static).
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:  # dépendance facultative : sans elle, seules les variantes gzip sont écrites
+    brotli = None
+
+
+# Dossier racine des documents, et dossier des écritures en cours (même système de fichiers)
+DOCUMENTS_DIR = 'documents'
+TMP_DIR = '.tmp'
+
+
+def blob_name(digest, ext):
+    """abcdef….pdf -> documents/ab/cd/abcdef….pdf"""
+    return f"{DOCUMENTS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def is_blob_name(name):
+    parts = name.split('/')
+    return len(parts) == 4 and parts[0] == DOCUMENTS_DIR and parts[3].startswith(parts[1] + parts[2])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Enregistre chaque fichier sous le nom de l'empreinte de son contenu. L'empreinte est
+    calculée pendant l'écriture, morceau par morceau : le fichier n'est jamais chargé en mémoire.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : il est choisi dans _save
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        tmp_dir = self.path(os.path.join(DOCUMENTS_DIR, TMP_DIR))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), ext)
+            # La ligne est créée ou rafraîchie avant de regarder si le fichier existe : le
+            # ramasse-miettes, qui revérifie son absence avant d'effacer le fichier, ne peut
+            # plus supprimer un contenu qu'on vient de décider de réutiliser
+            self._register(name, size)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Contenu déjà stocké : la copie temporaire est abandonnée
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                # Renommage atomique : deux téléversements simultanés du même contenu sont sans danger
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return name
+
+    @staticmethod
+    def _register(name, size):
+        """
+        Enregistre le contenu ; last_used_at est renouvelé à chaque réutilisation pour que le
+        ramasse-miettes ne supprime pas un fichier qu'une transaction en cours va référencer.
+        """
+        blob_model = apps.get_model('activities', 'DocumentBlob')
+        updated = blob_model.objects.filter(name=name).update(last_used_at=timezone.now())
+        if not updated:
+            blob_model.objects.get_or_create(name=name, defaults={'size': size})
+
+
+document_storage = ContentAddressedStorage()
+
+
+# --- Fichiers statiques ---
+
+# Extensions compressées à la collecte (les images et polices sont déjà compressées)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+
+# En dessous de cette taille, l'en-tête Content-Encoding coûte plus qu'il ne rapporte
+COMPRESS_MIN_SIZE = 256
+
+# Variantes précompressées : extension du fichier -> Content-Encoding
+ENCODINGS = {'.br': 'br', '.gz': 'gzip'}
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 : la même entrée donne toujours le même fichier
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Noms empreintés par le contenu (ManifestStaticFilesStorage), variantes .gz et .br
+    écrites à côté de chaque fichier empreinté, et cache en mémoire des URL résolues :
+    {% static %} ne fait plus qu'une recherche dans un dictionnaire.
+    Un fichier absent du manifeste (collectstatic pas encore lancé) garde son nom d'origine.
+    """
+    manifest_strict = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+        self._hashed_names = None
+
+    def url(self, name, force=False):
+        if force:
+            return super().url(name, force=True)
+        try:
+            return self._urls[name]
+        except KeyError:
+            pass
+        try:
+            url = super().url(name)
+        except ValueError:
+            url = FileSystemStorage.url(self, name)
+        self._urls[name] = url
+        return url
+
+    def post_process(self, paths, dry_run=False, **options):
+        self._urls = {}
+        self._hashed_names = None
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            if not hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(hashed_name) as original:
+                data = original.read()
+            if len(data) < COMPRESS_MIN_SIZE:
+                continue
+            for extension, encoding in ENCODINGS.items():
+                if encoding == 'br' and brotli is None:
+                    continue
+                compressed = _compress(data, encoding)
+                # Une variante à peine plus petite ne vaut pas le décodage côté client
+                if len(compressed) < len(data) * 0.95:
+                    variant = hashed_name + extension
+                    if self.exists(variant):
+                        self.delete(variant)
+                    self._save(variant, ContentFile(compressed))
+
+    def is_fingerprinted(self, name):
+        """Vrai si name est un nom empreinté du manifeste (contenu immuable)"""
+        if self._hashed_names is None:
+            self._hashed_names = frozenset(self.hashed_files.values())
+        return name in self._hashed_names
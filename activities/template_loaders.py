@@ -0,0 +1,60 @@
+"""
+Chargeurs de templates qui retirent l'indentation et les commentaires HTML du source des
+templates .html avant leur compilation. Placés sous le chargeur en cache de Django, le
+travail est fait une seule fois par template et par processus, pas à chaque rendu.
+"""
+import re
+
+from django.template.loaders import app_directories, filesystem
+
+
+# Blocs dont le contenu est laissé intact (espaces significatifs)
+PRESERVED_RE = re.compile(r'(<(pre|textarea)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+
+# Commentaires HTML, sauf les commentaires conditionnels (<!--[if IE]>)
+COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+
+# Espaces autour d'un saut de ligne (indentation, lignes vides)
+NEWLINE_RE = re.compile(r'[ \t]*(?:\r?\n[ \t]*)+')
+
+
+def _strip_comment(match):
+    comment = match.group(0)
+    # Un commentaire qui contient une balise de template peut encadrer un bloc : le garder
+    if '{%' in comment or '{{' in comment:
+        return comment
+    return ''
+
+
+def minify_html(source):
+    """
+    Retire les commentaires HTML et l'indentation. Chaque suite d'espaces contenant un saut
+    de ligne devient un seul saut de ligne : l'espace entre deux éléments en ligne est
+    conservé, et le JavaScript garde ses fins de ligne (insertion automatique des « ; »).
+    """
+    parts = PRESERVED_RE.split(source)
+    result = []
+    # split() avec deux groupes : texte, bloc préservé, nom de balise, texte, ...
+    for index in range(0, len(parts), 3):
+        text = COMMENT_RE.sub(_strip_comment, parts[index])
+        result.append(NEWLINE_RE.sub('\n', text))
+        if index + 1 < len(parts):
+            result.append(parts[index + 1])
+    return ''.join(result).strip() + '\n'
+
+
+class MinifyingLoaderMixin:
+
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        if origin.name.endswith('.html'):
+            return minify_html(contents)
+        return contents
+
+
+class FilesystemLoader(MinifyingLoaderMixin, filesystem.Loader):
+    pass
+
+
+class AppDirectoriesLoader(MinifyingLoaderMixin, app_directories.Loader):
+    pass
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..services.fragments import render_card_body
+
+register = template.Library()
+
+
+@register.simple_tag
+def activity_card_body(activity, variant='list'):
+    """Corps d'une carte d'activité, servi depuis le cache des fragments"""
+    return mark_safe(render_card_body(activity, variant))
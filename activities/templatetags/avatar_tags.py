@@ -0,0 +1,29 @@
+from django import template
+
+from ..services.avatars import variant_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user, size, fmt='webp'):
+    """URL de la variante de l'avatar adaptée à la taille affichée (en pixels CSS)"""
+    return variant_url(user, size, fmt)
+
+
+@register.inclusion_tag('partials/_avatar.html')
+def avatar_picture(user, size, css_class='', style=''):
+    """
+    Avatar en <picture> : WebP pour les navigateurs qui le lisent, JPEG sinon.
+    La variante choisie couvre les écrans haute densité (deux fois la taille affichée).
+    """
+    ready = bool(user.avatar) and user.avatar_variants_for == user.avatar.name
+    return {
+        'user': user,
+        'size': size,
+        'css_class': css_class,
+        'style': style,
+        'ready': ready,
+        'webp_url': variant_url(user, size * 2, 'webp') if ready else None,
+        'jpeg_url': variant_url(user, size * 2, 'jpg') if user.avatar else None,
+    }
@@ -1,3 +1,1352 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import storage
+from .froms import ArticleSearchForm, addNewActivity
+from .models import Activity, Category, DocumentBlob, FeedToken, User, WaitlistEntry
+from .services import aqi, avatars, facets, fragments, reservations, search
+from .template_loaders import minify_html
 
 # Create your tests here.
+
+AQI_OK = {'status': 'ok', 'data': {'aqi': 42}}
+
+
+@override_settings(AQI_CACHE_TIMEOUT=60, AQI_CACHE_STALE_TIMEOUT=600, AQI_CACHE_NEGATIVE_TIMEOUT=30)
+class AirQualityCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('activities.services.aqi._fetch_air_quality', return_value=AQI_OK)
+    def test_fresh_entry_is_served_from_cache(self, fetch):
+        self.assertEqual(aqi.get_air_quality('Montreal'), AQI_OK)
+        self.assertEqual(aqi.get_air_quality(' montreal '), AQI_OK)
+
+        self.assertEqual(fetch.call_count, 1)
+        stats = aqi.get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    @mock.patch('activities.services.aqi._fetch_air_quality',
+                side_effect=ValueError("Ville non trouvée ou données indisponibles"))
+    def test_unknown_city_is_cached_negatively(self, fetch):
+        for _ in range(3):
+            with self.assertRaisesMessage(ValueError, "Ville non trouvée"):
+                aqi.get_air_quality('Nulle-Part')
+
+        self.assertEqual(fetch.call_count, 1)
+
+    @mock.patch('activities.services.aqi._refresh_in_background')
+    @mock.patch('activities.services.aqi._fetch_air_quality', return_value=AQI_OK)
+    def test_stale_entry_is_served_while_refreshing(self, fetch, refresh):
+        aqi.get_air_quality('Laval')
+
+        with mock.patch('activities.services.aqi.time.time', return_value=aqi.time.time() + 120):
+            self.assertEqual(aqi.get_air_quality('Laval'), AQI_OK)
+
+        self.assertEqual(fetch.call_count, 1)
+        refresh.assert_called_once_with('Laval')
+        self.assertEqual(aqi.get_cache_stats()['stale'], 1)
+
+    def test_concurrent_misses_fetch_only_once(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch(city):
+            calls.append(city)
+            release.wait(5)
+            return AQI_OK
+
+        results = []
+        with mock.patch('activities.services.aqi._fetch_air_quality', side_effect=slow_fetch):
+            threads = [threading.Thread(target=lambda: results.append(aqi.get_air_quality('Quebec')))
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [AQI_OK] * 5)
+
+
+@mock.patch.dict('os.environ', {'AQICN_TOKEN': 'test'})
+class AQIClientTests(TestCase):
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        client = aqi.AQIClient(failure_threshold=2, cooldown=60)
+
+        with mock.patch.object(client, '_get', side_effect=aqi.socket.timeout('timed out')) as get:
+            for _ in range(2):
+                with self.assertRaisesMessage(ValueError, "timeout"):
+                    client.fetch('Montreal')
+            with self.assertRaises(aqi.CircuitOpenError):
+                client.fetch('Montreal')
+
+        self.assertEqual(get.call_count, 2)
+
+    def test_not_found_keeps_existing_message(self):
+        client = aqi.AQIClient()
+
+        with mock.patch.object(client, '_get', return_value=(404, 'Not Found', b'')):
+            with self.assertRaisesMessage(ValueError, "Ville non trouvée ou données indisponibles"):
+                client.fetch('Nulle-Part')
+
+        self.assertFalse(client.is_open)
+
+    def test_non_200_status_is_an_http_error(self):
+        client = aqi.AQIClient()
+
+        with mock.patch.object(client, '_get', return_value=(204, 'No Content', b'')):
+            with self.assertRaisesMessage(ValueError, "Erreur HTTP lors de la récupération des données AQI"):
+                client.fetch('Montreal')
+
+    def test_closed_keep_alive_connection_is_retried(self):
+        client = aqi.AQIClient()
+        stale, fresh = mock.Mock(), mock.Mock()
+        stale.request.side_effect = aqi.http.client.CannotSendRequest()
+        fresh.getresponse.return_value = mock.Mock(status=200, reason='OK', will_close=True,
+                                                   **{'read.return_value': b'{}'})
+
+        with mock.patch.object(client, '_acquire', return_value=(stale, True)), \
+                mock.patch.object(client, '_new_connection', return_value=fresh):
+            self.assertEqual(client._get('/feed/here/'), (200, 'OK', b'{}'))
+
+        stale.close.assert_called_once()
+
+
+class RefreshManyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('activities.services.aqi._fetch_air_quality', return_value=AQI_OK)
+    def test_equivalent_cities_are_fetched_once(self, fetch):
+        results = aqi.refresh_many(['Montreal', ' montreal', 'Laval'])
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(set(results), {'Montreal', 'Laval'})
+
+    def test_unexpected_errors_are_reported_per_city(self):
+        def flaky_refresh(city):
+            if city == 'Laval':
+                raise ConnectionError("cache indisponible")
+            return AQI_OK
+
+        with mock.patch('activities.services.aqi.refresh_air_quality', side_effect=flaky_refresh):
+            results = aqi.refresh_many(['Montreal', 'Laval'])
+
+        self.assertIsNone(results['Montreal'])
+        self.assertIn("cache indisponible", results['Laval'])
+
+
+class ActivityFixturesMixin:
+    """Création rapide d'utilisateurs, de catégories et d'activités pour les tests"""
+
+    def setUp(self):
+        super().setUp()
+        # Les caches (registre des catégories...) survivent au rollback des tests
+        cache.clear()
+        self.user = User.objects.create_user(username='organisateur', password='motdepasse123')
+        self.category = Category.objects.create(name='Randonnée')
+
+    def create_activity(self, city='Montreal', days=1, **kwargs):
+        start = kwargs.pop('start_time', timezone.now() + timedelta(days=days))
+        fields = {
+            'title': "Sortie en plein air",
+            'description': "Une belle sortie en nature.",
+            'location_city': city,
+            'start_time': start,
+            'end_time': start + timedelta(hours=2),
+            'proposer': self.user,
+            'category': self.category,
+        }
+        fields.update(kwargs)
+        return Activity.objects.create(**fields)
+
+
+@override_settings(AQI_PREWARM_MAX_CITIES=10, AQI_PREWARM_WORKERS=3, AQI_PREWARM_INTERVAL=42)
+class PrewarmAQICommandTests(ActivityFixturesMixin, TestCase):
+
+    def run_command(self, *args):
+        out = StringIO()
+        with mock.patch('activities.management.commands.prewarm_aqi.refresh_many', return_value={}) as refresh:
+            call_command('prewarm_aqi', *args, stdout=out, stderr=StringIO())
+        return refresh
+
+    def test_prewarms_distinct_upcoming_cities(self):
+        self.create_activity('Montreal', days=1)
+        self.create_activity(' montreal ', days=2)
+        self.create_activity('Laval', days=3)
+        past = self.create_activity('Quebec', days=4)
+        Activity.objects.filter(pk=past.pk).update(start_time=timezone.now() - timedelta(days=1))
+        blank = self.create_activity('Gatineau', days=5)
+        Activity.objects.filter(pk=blank.pk).update(location_city='')
+
+        refresh = self.run_command()
+
+        refresh.assert_called_once_with(['Montreal', 'Laval'], max_workers=3)
+
+    def test_city_budget_is_applied(self):
+        for day, city in enumerate(['Montreal', 'Laval', 'Quebec'], start=1):
+            self.create_activity(city, days=day)
+
+        refresh = self.run_command('--max-cities', '2')
+
+        refresh.assert_called_once_with(['Montreal', 'Laval'], max_workers=3)
+
+    def test_loop_sleeps_between_passes(self):
+        self.create_activity('Montreal')
+
+        with mock.patch('activities.management.commands.prewarm_aqi.time.sleep',
+                        side_effect=[None, KeyboardInterrupt]) as sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_command('--loop')
+
+        sleep.assert_called_with(42)
+        self.assertEqual(sleep.call_count, 2)
+
+
+class AirQualityBadgesTests(TestCase):
+
+    def test_slow_cities_are_pending_after_deadline(self):
+        release = threading.Event()
+
+        def fake_get(city):
+            if city == 'Lente':
+                release.wait(5)
+            return {'status': 'ok', 'data': {'aqi': 120}}
+
+        with mock.patch('activities.services.aqi.get_air_quality', side_effect=fake_get):
+            started = time.monotonic()
+            badges = aqi.get_air_quality_badges(['Rapide', 'Lente', ' rapide'], deadline=0.2)
+            elapsed = time.monotonic() - started
+            release.set()
+
+        self.assertLess(elapsed, 1)
+        self.assertEqual(badges['lente'], {'status': 'pending'})
+        self.assertEqual(badges['rapide']['status'], 'ok')
+        self.assertEqual(badges['rapide']['level'], 'Mauvais pour les sensibles')
+        self.assertEqual(len(badges), 2)
+
+    @mock.patch('activities.services.aqi.get_air_quality', side_effect=ValueError("Ville non trouvée"))
+    def test_errors_are_unavailable(self, get):
+        badges = aqi.get_air_quality_badges(['Nulle-Part'], deadline=1)
+
+        self.assertEqual(badges['nulle-part'], {'status': 'unavailable'})
+
+
+@override_settings(ACTIVITIES_PER_PAGE=2)
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class ActivityListPaginationTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        same_time = timezone.now() + timedelta(days=3)
+        self.activities = [
+            self.create_activity(days=1),
+            self.create_activity(days=2),
+            self.create_activity(start_time=same_time),
+            self.create_activity(start_time=same_time),
+            self.create_activity(days=4),
+        ]
+
+    def get_ids(self, response):
+        return [activity.id for activity in response.context['activities']]
+
+    def test_walks_forward_and_back_with_cursors(self, badges):
+        url = reverse('activity_list')
+        expected = [activity.id for activity in self.activities]
+
+        seen = []
+        response = self.client.get(url)
+        self.assertIsNone(response.context['previous_page_url'])
+        while True:
+            seen += self.get_ids(response)
+            if not response.context['next_page_url']:
+                break
+            response = self.client.get(url + response.context['next_page_url'])
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(url + response.context['previous_page_url'])
+        self.assertEqual(self.get_ids(response), expected[2:4])
+
+    def test_cursor_keeps_filters(self, badges):
+        response = self.client.get(reverse('activity_list'), {'category': 'all', 'scoop': 'all'})
+        next_url = response.context['next_page_url']
+
+        self.assertIn('category=all', next_url)
+        self.assertIn('scoop=all', next_url)
+        self.assertNotIn('before=', next_url)
+
+    def test_invalid_cursor_is_a_bad_request(self, badges):
+        response = self.client.get(reverse('activity_list'), {'after': 'pas-un-curseur'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class ActivityCardQueriesTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+        for day in range(1, 13):
+            activity = self.create_activity(days=day)
+            activity.attendees.add(self.visitor)
+        self.client.force_login(self.visitor)
+
+    def count_queries(self, url, **params):
+        # Premier appel pour remplir les caches (registre des catégories)
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_activity_list_query_count_does_not_depend_on_page_size(self, badges):
+        with override_settings(ACTIVITIES_PER_PAGE=2):
+            small = self.count_queries(reverse('activity_list'), scoop='inscrit')
+        with override_settings(ACTIVITIES_PER_PAGE=10):
+            large = self.count_queries(reverse('activity_list'), scoop='inscrit')
+
+        self.assertEqual(small, large)
+
+    def test_home_query_count_does_not_depend_on_activities(self, badges):
+        before = self.count_queries(reverse('home'))
+        for day in range(20, 30):
+            self.create_activity(days=day)
+
+        self.assertEqual(self.count_queries(reverse('home')), before)
+
+    def test_profile_query_count_does_not_depend_on_activities(self, badges):
+        before = self.count_queries(reverse('profile'))
+        for day in range(20, 30):
+            self.create_activity(days=day).attendees.add(self.visitor)
+
+        self.assertEqual(self.count_queries(reverse('profile')), before)
+
+    def test_attendee_count_is_not_limited_by_attendee_filter(self, badges):
+        other = User.objects.create_user(username='autre', password='motdepasse123')
+        activity = Activity.objects.first()
+        activity.attendees.add(other)
+
+        annotated = Activity.objects.for_cards().filter(attendees=self.visitor).get(pk=activity.pk)
+
+        self.assertEqual(annotated.attendee_count, 2)
+
+
+class ProfileStatsTests(ActivityFixturesMixin, TestCase):
+
+    def test_stats_are_computed_in_one_query(self):
+        visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+        for day in range(1, 4):
+            self.create_activity(days=day).attendees.add(visitor, self.user)
+        self.create_activity(days=5, proposer=visitor).attendees.add(self.user)
+
+        with self.assertNumQueries(1):
+            stats = Activity.objects.stats_for(self.user)
+
+        self.assertEqual(stats, {'proposed': 3, 'attending': 4})
+
+    @override_settings(PROFILE_ACTIVITIES_LIMIT=2)
+    def test_profile_lists_are_capped(self):
+        for day in range(1, 6):
+            self.create_activity(days=day)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('profile'))
+
+        self.assertEqual(len(response.context['activities_proposed']), 2)
+        self.assertEqual(response.context['hidden_proposed_count'], 3)
+        self.assertContains(response, "et 3 activités plus anciennes")
+
+
+@override_settings(ATTENDEES_PER_PAGE=3)
+@mock.patch('activities.views.get_air_quality', return_value=AQI_OK)
+class ActivityAttendeesTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity()
+        self.visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+        self.client.force_login(self.visitor)
+
+    def add_attendees(self, count, start=0):
+        users = User.objects.bulk_create(
+            User(username=f'participant{i:03d}') for i in range(start, start + count)
+        )
+        self.activity.attendees.add(*users)
+
+    def count_detail_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('activity_detail', args=[self.activity.id]), params)
+        return response, len(queries)
+
+    def test_detail_query_count_does_not_depend_on_attendees(self, get):
+        self.add_attendees(2)
+        _, before = self.count_detail_queries()
+        self.add_attendees(40, start=2)
+
+        response, after = self.count_detail_queries(participants=2)
+
+        self.assertEqual(before, after)
+        self.assertEqual(response.context['participant_count'], 42)
+        self.assertEqual([a.username for a in response.context['attendees']],
+                         ['participant003', 'participant004', 'participant005'])
+
+    def test_reservation_toggles_membership(self, get):
+        url = reverse('reserve_activity', args=[self.activity.id])
+
+        self.client.get(url)
+        response, _ = self.count_detail_queries()
+        self.assertTrue(response.context['is_attending'])
+
+        self.client.get(url)
+        response, _ = self.count_detail_queries()
+        self.assertFalse(response.context['is_attending'])
+
+
+class ReservationTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity(capacity=1)
+        self.first = User.objects.create_user(username='premier', password='motdepasse123')
+        self.second = User.objects.create_user(username='second', password='motdepasse123')
+
+    def test_full_activity_puts_users_on_waitlist(self):
+        self.assertEqual(reservations.reserve(self.activity, self.first), reservations.RESERVED)
+        self.assertEqual(reservations.reserve(self.activity, self.first), reservations.ALREADY_RESERVED)
+        self.assertEqual(reservations.reserve(self.activity, self.second), reservations.WAITLISTED)
+
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.reserved_count, 1)
+        self.assertEqual(self.activity.places_left, 0)
+
+    def test_cancellation_promotes_first_waitlisted_user(self):
+        reservations.reserve(self.activity, self.first)
+        reservations.reserve(self.activity, self.second)
+
+        result, promoted = reservations.cancel(self.activity, self.first)
+
+        self.assertEqual((result, promoted), (reservations.CANCELLED, self.second))
+        self.assertEqual(list(self.activity.attendees.all()), [self.second])
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.reserved_count, 1)
+
+    def test_cancellation_without_waitlist_frees_the_place(self):
+        reservations.reserve(self.activity, self.first)
+
+        reservations.cancel(self.activity, self.first)
+
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.reserved_count, 0)
+
+    def test_deleting_an_attendee_frees_the_place_for_the_waitlist(self):
+        reservations.reserve(self.activity, self.first)
+        reservations.reserve(self.activity, self.second)
+
+        self.first.delete()
+
+        self.activity.refresh_from_db()
+        self.assertEqual(list(self.activity.attendees.all()), [self.second])
+        self.assertEqual(self.activity.reserved_count, 1)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_deleting_the_only_attendee_frees_the_place(self):
+        reservations.reserve(self.activity, self.first)
+        self.first.delete()
+
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.reserved_count, 0)
+        self.assertEqual(reservations.reserve(self.activity, self.second), reservations.RESERVED)
+
+    def test_capacity_increase_promotes_waitlist(self):
+        third = User.objects.create_user(username='troisieme', password='motdepasse123')
+        for user in (self.first, self.second, third):
+            reservations.reserve(self.activity, user)
+
+        self.activity.capacity = 2
+        self.activity.save()
+
+        self.assertEqual(set(self.activity.attendees.all()), {self.first, self.second})
+        self.assertEqual(list(self.activity.waitlist.values_list('user', flat=True)), [third.pk])
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.reserved_count, 2)
+
+    def test_newcomer_cannot_skip_the_waitlist(self):
+        reservations.reserve(self.activity, self.first)
+        reservations.reserve(self.activity, self.second)
+        # Place libérée sans passer par le service (ni signal) : la liste d'attente reste prioritaire
+        Activity.objects.filter(pk=self.activity.pk).update(capacity=2)
+        third = User.objects.create_user(username='troisieme', password='motdepasse123')
+
+        self.assertEqual(reservations.reserve(self.activity, third), reservations.WAITLISTED)
+        self.assertEqual(reservations.promote_waitlist(self.activity.pk), [self.second])
+
+
+class ReservationStressTests(ActivityFixturesMixin, TransactionTestCase):
+
+    def reserve_with_retry(self, activity_id, user_id):
+        """Réserve depuis un thread ; SQLite peut refuser une écriture concurrente, on réessaie alors"""
+        try:
+            for _ in range(500):
+                try:
+                    activity = Activity.objects.get(pk=activity_id)
+                    user = User.objects.get(pk=user_id)
+                    return reservations.reserve(activity, user)
+                except OperationalError:
+                    time.sleep(0.005)
+            raise AssertionError("Réservation impossible après plusieurs essais")
+        finally:
+            connections.close_all()
+
+    def test_concurrent_reservations_never_exceed_capacity(self):
+        capacity = 25
+        activity = self.create_activity(capacity=capacity)
+        users = User.objects.bulk_create(User(username=f'rush{i:03d}') for i in range(200))
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda user: self.reserve_with_retry(activity.pk, user.pk), users))
+
+        activity.refresh_from_db()
+        self.assertEqual(results.count(reservations.RESERVED), capacity)
+        self.assertEqual(results.count(reservations.WAITLISTED), len(users) - capacity)
+        self.assertEqual(activity.attendees.count(), capacity)
+        self.assertEqual(activity.reserved_count, capacity)
+        self.assertEqual(activity.waitlist.count(), len(users) - capacity)
+
+
+class CategoryRegistryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_choices_follow_category_changes(self):
+        self.assertEqual(ArticleSearchForm().fields['category'].choices, [('all', 'Toutes les activités')])
+
+        kayak = Category.objects.create(name='Kayak')
+        self.assertIn(('Kayak', 'Kayak'), ArticleSearchForm().fields['category'].choices)
+        self.assertTrue(ArticleSearchForm({'category': 'Kayak'}).is_valid())
+
+        kayak.delete()
+        self.assertFalse(ArticleSearchForm({'category': 'Kayak'}).is_valid())
+
+    def test_registry_is_served_from_cache(self):
+        Category.objects.create(name='Escalade')
+        ArticleSearchForm({'category': 'Escalade'}).is_valid()
+
+        with self.assertNumQueries(0):
+            form = ArticleSearchForm({'category': 'Escalade'})
+            self.assertTrue(form.is_valid())
+            addNewActivity()
+
+    @override_settings(CATEGORY_REGISTRY_TIMEOUT=60)
+    def test_registry_expires_when_invalidation_is_missed(self):
+        # Catégorie créée par un autre processus : le signal n'a pas vidé le cache local
+        ArticleSearchForm({'category': 'Kayak'}).is_valid()
+        Category.objects.bulk_create([Category(name='Canot')])
+        self.assertFalse(ArticleSearchForm({'category': 'Canot'}).is_valid())
+
+        later = time.time() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertTrue(ArticleSearchForm({'category': 'Canot'}).is_valid())
+
+
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class ActivitySearchTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.kayak = self.create_activity(
+            title="Kayak sur la rivière", description="Descente tranquille.", city='Québec')
+        self.hike = self.create_activity(
+            title="Randonnées au mont Royal", description="Marche et observation des oiseaux.")
+        self.bird = self.create_activity(
+            title="Pique-nique", description="Observation des oiseaux près de la rivière.")
+
+    def search(self, query):
+        response = self.client.get(reverse('activity_list'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [activity.id for activity in response.context['activities']]
+
+    def test_folds_accents_and_stems(self, badges):
+        self.assertEqual(self.search('randonnee'), [self.hike.id])
+        self.assertEqual(self.search('QUEBEC'), [self.kayak.id])
+        self.assertEqual(self.search('observations oiseau'), [self.hike.id, self.bird.id])
+
+    def test_title_matches_rank_first(self, badges):
+        self.assertEqual(self.search('rivière'), [self.kayak.id, self.bird.id])
+
+    def test_index_follows_changes(self, badges):
+        self.kayak.title = "Canot sur le lac"
+        self.kayak.save()
+        self.assertEqual(self.search('canot'), [self.kayak.id])
+        self.assertEqual(self.search('kayak'), [])
+
+        self.kayak.delete()
+        self.assertEqual(self.search('canot'), [])
+
+    @mock.patch('activities.services.search.REBUILD_BATCH_SIZE', 2)
+    def test_rebuild_index_in_batches(self, badges):
+        def ids(query):
+            return list(search.search_activities(Activity.objects.all(), query).values_list('id', flat=True))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(ids('oiseaux'), [])
+
+        search.rebuild_index()
+        self.assertEqual(ids('oiseaux'), [self.hike.id, self.bird.id])
+        self.assertEqual(ids('kayak'), [self.kayak.id])
+
+    def test_search_keeps_filters(self, badges):
+        other = Category.objects.create(name='Nautique')
+        self.kayak.category = other
+        self.kayak.save()
+
+        response = self.client.get(reverse('activity_list'), {'q': 'rivière', 'category': 'Nautique'})
+        self.assertEqual([activity.id for activity in response.context['activities']], [self.kayak.id])
+
+
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class ActivityFacetsTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.nautical = Category.objects.create(name='Nautique')
+        self.hike_mtl = self.create_activity(city='Montréal')
+        self.hike_qc = self.create_activity(city='Québec')
+        self.kayak_qc = self.create_activity(city='Québec', category=self.nautical)
+        Category.objects.create(name='Vide')
+
+    def get(self, params):
+        response = self.client.get(reverse('activity_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_multi_select_filters(self, badges):
+        response = self.get({'category': ['Randonnée', 'Nautique'], 'city': ['Québec']})
+        ids = {activity.id for activity in response.context['activities']}
+        self.assertEqual(ids, {self.hike_qc.id, self.kayak_qc.id})
+
+    def test_counts_follow_the_other_facet(self, badges):
+        facets = self.get({'city': 'Québec'}).context['facets']
+
+        # Les catégories sans activité à venir ne sont pas proposées
+        self.assertEqual(facets['categories'], [('Nautique', 1), ('Randonnée', 1)])
+        # Le choix d'une ville ne masque pas les autres villes
+        self.assertEqual(facets['cities'], [('Montréal', 1), ('Québec', 2)])
+
+    def test_counts_come_from_one_cached_query(self, badges):
+        # Connecté : les pages ne sont pas servies par le cache des pages anonymes
+        self.client.login(username='organisateur', password='motdepasse123')
+        self.get({})
+        with CaptureQueriesContext(connection) as first:
+            self.get({'category': 'Nautique'})
+        with CaptureQueriesContext(connection) as cached:
+            self.get({'category': 'Nautique'})
+
+        group_by = [query for query in first.captured_queries if 'GROUP BY' in query['sql']]
+        self.assertLessEqual(len(group_by), 1)
+        self.assertEqual(len(cached.captured_queries), len(first.captured_queries) - len(group_by))
+
+    def test_date_ranges(self, badges):
+        in_two_weeks = self.create_activity(days=14)
+        next_week = timezone.localdate() + timedelta(days=10)
+
+        response = self.get({'when': 'week'})
+        self.assertNotIn(in_two_weeks, response.context['activities'])
+
+        response = self.get({'when': 'custom', 'date_from': in_two_weeks.start_time.date()})
+        self.assertEqual(list(response.context['activities']), [in_two_weeks])
+
+        response = self.client.get(reverse('activity_list'), {
+            'when': 'custom', 'date_from': next_week, 'date_to': timezone.localdate(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_weekend_range(self, badges):
+        friday = timezone.make_aware(datetime(2026, 10, 16, 12, 0))
+        sunday = timezone.make_aware(datetime(2026, 10, 18, 9, 0))
+        saturday_midnight = timezone.make_aware(datetime(2026, 10, 17))
+        monday_midnight = timezone.make_aware(datetime(2026, 10, 19))
+
+        self.assertEqual(facets.date_range('weekend', now=friday), (saturday_midnight, monday_midnight))
+        self.assertEqual(facets.date_range('weekend', now=sunday), (sunday, monday_midnight))
+
+
+class ActivityCardCacheTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity()
+        fragments.reset_fragment_stats()
+
+    def render(self, variant='list'):
+        activity = Activity.objects.for_cards().get(pk=self.activity.pk)
+        return fragments.render_card_body(activity, variant)
+
+    def assert_rerendered(self, text):
+        misses = fragments.get_fragment_stats()['misses']
+        self.assertIn(text, self.render())
+        self.assertEqual(fragments.get_fragment_stats()['misses'], misses + 1)
+
+    def test_second_render_is_a_hit(self):
+        first = self.render()
+        with self.assertNumQueries(0):
+            self.assertEqual(fragments.render_card_body(self.activity, 'list'), first)
+        self.assertEqual(fragments.get_fragment_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_hit_costs_two_cache_reads(self):
+        activity = Activity.objects.for_cards().get(pk=self.activity.pk)
+        fragments.render_card_body(activity)
+        with mock.patch.object(fragments, 'cache', wraps=fragments.cache) as spy:
+            fragments.render_card_body(activity)
+        # Compteurs de version en un get_many, puis le fragment ; statistiques reportées plus tard
+        self.assertEqual([call[0] for call in spy.method_calls], ['get_many', 'get'])
+        self.assertEqual(fragments.get_fragment_stats()['hits'], 1)
+
+    def test_variants_keep_their_own_markup(self):
+        home = self.render('home')
+        self.assertIn('Date de début', home)
+        self.assertNotIn('Propriétaire', home)
+        self.assertIn('Propriétaire', self.render('list'))
+        self.assertIn('Organisateur', self.render('attending'))
+        full = self.render('full')
+        self.assertIn('Participants', full)
+        self.assertIn('card-actions', full)
+        self.assertEqual(fragments.get_fragment_stats()['misses'], 4)
+
+    def test_invalidated_by_related_changes(self):
+        self.render()
+
+        Activity.objects.filter(pk=self.activity.pk).update(location_city='Laval')
+        self.assertNotIn('Laval', self.render())  # update() ne déclenche pas post_save
+
+        self.activity.refresh_from_db()
+        self.activity.save()
+        self.assert_rerendered('Laval')
+
+        self.user.username = 'nouveau_nom'
+        self.user.save()
+        self.assert_rerendered('nouveau_nom')
+
+        self.category.name = 'Marche'
+        self.category.save()
+        self.assert_rerendered('nouveau_nom')
+
+    def test_invalidated_by_attendees(self):
+        self.render('proposed')
+        visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+
+        visitor.attended_activities.add(self.activity)
+        activity = Activity.objects.for_cards().get(pk=self.activity.pk)
+        self.assertRegex(fragments.render_card_body(activity, 'proposed'), r'Participants:</strong>\s*1\s')
+        self.assertEqual(fragments.get_fragment_stats()['misses'], 2)
+
+    def test_stats_require_staff(self):
+        url = reverse('cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        User.objects.create_user(username='admin', password='motdepasse123', is_staff=True)
+        self.client.login(username='admin', password='motdepasse123')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['activity_cards']['misses'], 0)
+
+
+@mock.patch('activities.views.get_air_quality', return_value=AQI_OK)
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class ConditionalGetTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity()
+        self.visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_pages_are_not_modified(self, badges, air_quality):
+        for url in (reverse('index'), reverse('activity_list'), reverse('activity_detail', args=[self.activity.pk])):
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_attendee_change_updates_validator(self, badges, air_quality):
+        url = reverse('activity_detail', args=[self.activity.pk])
+        etag = self.client.get(url)['ETag']
+        before = Activity.objects.get(pk=self.activity.pk).updated_at
+
+        reservations.reserve(self.activity, self.visitor)
+
+        self.assertGreater(Activity.objects.get(pk=self.activity.pk).updated_at, before)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_validator_varies_by_user(self, badges, air_quality):
+        url = reverse('activity_detail', args=[self.activity.pk])
+        etag = self.client.get(url)['ETag']
+
+        self.client.login(username='visiteur', password='motdepasse123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@mock.patch('activities.views.get_air_quality_badges', return_value={})
+class AnonymousPageCacheTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity(title="Sortie au lac")
+
+    def test_anonymous_pages_are_served_from_cache(self, badges):
+        url = reverse('activity_list')
+        first = self.client.get(url, {'scoop': 'all', 'category': 'all'})
+
+        # Même chaîne de requête dans un autre ordre : aucune requête SQL
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'category': 'all', 'scoop': 'all'})
+        self.assertEqual(cached.content, first.content)
+
+    def test_changes_bump_the_generation(self, badges):
+        url = reverse('index')
+        self.client.get(url)
+
+        self.activity.title = "Sortie à la rivière"
+        self.activity.save()
+        self.assertContains(self.client.get(url), "Sortie à la rivière")
+
+        Category.objects.create(name='Nautique')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 0)
+
+    def test_authenticated_users_bypass_the_cache(self, badges):
+        url = reverse('index')
+        self.client.get(url)
+
+        self.client.login(username='organisateur', password='motdepasse123')
+        response = self.client.get(url)
+        self.assertContains(response, 'Déconnexion')
+        self.assertIsNotNone(response.context)
+
+
+class ActivityAPITests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activities = [self.create_activity(days=day, city=city) for day, city in
+                           [(1, 'Montréal'), (2, 'Québec'), (3, 'Montréal')]]
+
+    def test_sparse_fields_and_keyset_pages(self):
+        url = reverse('api_activity_list')
+        data = self.client.get(url, {'fields': 'id,location_city', 'limit': 2}).json()
+
+        self.assertEqual(data['results'], [
+            {'id': self.activities[0].pk, 'location_city': 'Montréal'},
+            {'id': self.activities[1].pk, 'location_city': 'Québec'},
+        ])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.activities[2].pk])
+        self.assertIsNone(data['next'])
+
+    def test_filters_and_errors(self):
+        url = reverse('api_activity_list')
+        data = self.client.get(url, {'city': 'Montréal', 'fields': 'id'}).json()
+        self.assertEqual([row['id'] for row in data['results']], [self.activities[0].pk, self.activities[2].pk])
+
+        self.assertEqual(self.client.get(url, {'fields': 'id,mot_de_passe'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'category': 'Inconnue'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'after': 'invalide'}).status_code, 400)
+
+    def test_detail(self):
+        activity = self.activities[0]
+        data = self.client.get(reverse('api_activity_detail', args=[activity.pk])).json()
+
+        self.assertEqual(data['category'], 'Randonnée')
+        self.assertEqual(data['attendee_count'], 0)
+        self.assertEqual(self.client.get(reverse('api_activity_detail', args=[0])).status_code, 404)
+
+    def test_stream_export(self):
+        response = self.client.get(reverse('api_activity_list'), {'stream': '1', 'fields': 'id,title'})
+
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in data], [activity.pk for activity in self.activities])
+
+
+class ActivityFeedTests(ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = self.create_activity(title="Kayak, lac; et rivière", description="Ligne 1\nLigne 2")
+        self.token = FeedToken.for_user(self.user)
+
+    def feed_url(self, scoop='mine', fmt='ics'):
+        return reverse('user_feed', args=[self.token.token, scoop, fmt])
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ics_feed(self):
+        body = self.read(self.client.get(self.feed_url()))
+
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:activity-{self.activity.pk}@', body)
+        self.assertIn('SUMMARY:Kayak\\, lac\\; et rivière\r\n', body)
+        self.assertIn('DESCRIPTION:Ligne 1\\nLigne 2\r\n', body)
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in body.split('\r\n')))
+
+    def test_csv_feed_and_scopes(self):
+        visitor = User.objects.create_user(username='visiteur', password='motdepasse123')
+        visitor_token = FeedToken.for_user(visitor)
+        reservations.reserve(self.activity, visitor)
+
+        body = self.read(self.client.get(reverse('user_feed', args=[visitor_token.token, 'inscrit', 'csv'])))
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1:4], ["Kayak, lac; et rivière", "Ligne 1\nLigne 2", 'Montreal'])
+
+        body = self.read(self.client.get(reverse('user_feed', args=[visitor_token.token, 'mine', 'csv'])))
+        self.assertEqual(len(list(csv.reader(StringIO(body)))), 1)
+
+    def test_unchanged_feed_is_not_modified(self):
+        etag = self.client.get(self.feed_url())['ETag']
+        with self.assertNumQueries(2):  # jeton + agrégat
+            response = self.client.get(self.feed_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.activity.title = "Canot"
+        self.activity.save()
+        self.assertEqual(self.client.get(self.feed_url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tokens(self):
+        self.assertEqual(self.client.get(reverse('user_feed', args=['inconnu', 'mine', 'ics'])).status_code, 404)
+
+        old_url = self.feed_url()
+        self.client.login(username='organisateur', password='motdepasse123')
+        self.client.post(reverse('regenerate_feed_token'))
+        self.token.refresh_from_db()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        self.assertEqual(self.client.get(self.feed_url()).status_code, 200)
+
+    def test_category_feed(self):
+        response = self.client.get(reverse('category_feed', args=[self.category.pk, 'ics']))
+        self.assertIn('CATEGORIES:Randonnée', self.read(response))
+
+
+class MediaRootMixin:
+    """Fichiers téléversés écrits dans un dossier temporaire supprimé après chaque test"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def make_image(size=(800, 600), fmt='JPEG', name='photo.jpg', exif=True):
+    image = Image.new('RGB', size, (30, 120, 60))
+    buffer = BytesIO()
+    options = {}
+    if exif:
+        metadata = Image.Exif()
+        metadata[0x010F] = 'Appareil secret'  # Make
+        options['exif'] = metadata
+    image.save(buffer, fmt, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class AvatarVariantsTests(MediaRootMixin, ActivityFixturesMixin, TestCase):
+
+    def test_generates_small_stripped_variants(self):
+        self.user.avatar = make_image()
+        self.user.save()
+        original_size = self.user.avatar.size
+
+        avatars.generate_variants(self.user.pk, self.user.avatar.name)
+        self.user.refresh_from_db()
+
+        self.assertEqual(self.user.avatar_variants_for, self.user.avatar.name)
+        for size in avatars.AVATAR_SIZES:
+            for fmt in avatars.FORMATS:
+                with default_storage.open(avatars.variant_name(self.user.avatar.name, size, fmt)) as variant:
+                    image = Image.open(variant)
+                    self.assertEqual(image.size, (size, size))
+                    self.assertFalse(image.getexif())
+        small = default_storage.size(avatars.variant_name(self.user.avatar.name, 32, 'webp'))
+        self.assertLess(small, original_size / 10)
+
+        self.assertTrue(avatars.variant_url(self.user, 40).endswith('_96.webp'))
+        self.assertTrue(avatars.variant_url(self.user, 1000, 'jpg').endswith('_256.jpg'))
+
+    def test_falls_back_to_original_until_ready(self):
+        self.user.avatar = make_image()
+        self.user.save()
+        self.assertEqual(avatars.variant_url(self.user, 32), self.user.avatar.url)
+
+        self.client.login(username='organisateur', password='motdepasse123')
+        response = self.client.get(reverse('profile'))
+        self.assertContains(response, self.user.avatar.url)
+        self.assertNotContains(response, '<source type="image/webp"')
+
+    def test_upload_schedules_background_generation(self):
+        with mock.patch.object(avatars._executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.avatar = make_image()
+                self.user.save()
+            submit.assert_called_once_with(avatars._run, self.user.pk, self.user.avatar.name, '')
+
+            # Les sauvegardes qui ne touchent pas à l'avatar ne replanifient rien
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save(update_fields=['last_login'])
+            self.assertEqual(submit.call_count, 1)
+
+
+class DocumentStorageTests(MediaRootMixin, ActivityFixturesMixin, TestCase):
+
+    def upload(self, content, name='programme.pdf'):
+        return SimpleUploadedFile(name, content, content_type='application/pdf')
+
+    def test_identical_documents_are_stored_once(self):
+        content = b'%PDF-1.4 programme de la sortie' * 1000
+        first = self.create_activity(document=self.upload(content))
+        second = self.create_activity(document=self.upload(content, 'copie.PDF'))
+
+        digest = hashlib.sha256(content).hexdigest()
+        expected = f"documents/{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+        self.assertEqual(first.document.name, expected)
+        self.assertEqual(second.document.name, expected)
+        self.assertNotIn('activity_None', first.document.name)
+        with first.document.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(DocumentBlob.objects.get().size, len(content))
+        # Aucune copie temporaire ne reste après l'écriture
+        self.assertEqual(default_storage.listdir('documents/.tmp')[1], [])
+
+    def test_gc_removes_only_unreferenced_documents_after_grace_period(self):
+        kept = self.create_activity(document=self.upload(b'garde'))
+        dropped = self.create_activity(document=self.upload(b'supprime'))
+        dropped_name = dropped.document.name
+        Activity.objects.filter(pk=dropped.pk).update(document='')
+
+        call_command('gc_documents', stdout=StringIO())
+        self.assertTrue(default_storage.exists(dropped_name))
+
+        call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertFalse(default_storage.exists(dropped_name))
+        self.assertTrue(default_storage.exists(kept.document.name))
+        self.assertEqual(list(DocumentBlob.objects.values_list('name', flat=True)), [kept.document.name])
+
+    def test_gc_keeps_file_reused_by_a_concurrent_upload(self):
+        activity = self.create_activity(document=self.upload(b'reutilise'))
+        name = activity.document.name
+        Activity.objects.filter(pk=activity.pk).update(document='')
+        delete = DocumentBlob.objects.none().delete.__func__
+
+        def delete_then_upload(queryset):
+            result = delete(queryset)
+            # Le même contenu est téléversé entre la suppression de la ligne et celle du fichier
+            storage.document_storage.save('copie.pdf', ContentFile(b'reutilise'))
+            return result
+
+        with mock.patch('django.db.models.query.QuerySet.delete', delete_then_upload):
+            call_command('gc_documents', '--grace-hours=0', stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(DocumentBlob.objects.filter(name=name).exists())
+
+    def test_adopt_legacy_documents(self):
+        default_storage.save('documents/activity_None/doc_1234abcd.pdf', ContentFile(b'ancien'))
+        activity = self.create_activity()
+        Activity.objects.filter(pk=activity.pk).update(document='documents/activity_None/doc_1234abcd.pdf')
+
+        call_command('gc_documents', '--adopt-legacy', stdout=StringIO())
+        activity.refresh_from_db()
+        self.assertEqual(activity.document.name, storage.blob_name(hashlib.sha256(b'ancien').hexdigest(), '.pdf'))
+        self.assertFalse(default_storage.exists('documents/activity_None/doc_1234abcd.pdf'))
+
+
+class MediaServingTests(MediaRootMixin, ActivityFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 400
+        activity = self.create_activity(document=SimpleUploadedFile('programme.pdf', self.content))
+        self.url = activity.document.url
+        self.etag = '"{}"'.format(hashlib.sha256(self.content).hexdigest())
+
+    def login(self):
+        self.client.login(username='organisateur', password='motdepasse123')
+
+    def test_documents_require_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+
+    def test_document_is_streamed_with_immutable_caching(self):
+        self.login()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        cache_control = response['Cache-Control']
+        self.assertIn('immutable', cache_control)
+        self.assertIn('private', cache_control)
+        self.assertIn('max-age=31536000', cache_control)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        self.login()
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+        # If-Range ne correspond plus : le fichier complet est renvoyé
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"ancien"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_transfer_is_handed_to_front_end_server(self):
+        self.login()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.url[len('/media/'):])
+
+    def test_avatars_are_public_and_revalidated(self):
+        self.user.avatar = make_image()
+        self.user.save()
+        response = self.client.get(self.user.avatar.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get(self.user.avatar.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_paths_are_not_served(self):
+        self.login()
+        for url in ('/media/documents/.tmp/x', '/media/documents/../../manage.py', '/media/secret.txt'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+
+class StaticAssetsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root)
+        cls.settings_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.url = staticfiles_storage.url('activities/css/style.css')
+        with open(staticfiles_storage.path('activities/css/style.css'), 'rb') as original:
+            self.content = original.read()
+
+    def test_names_are_fingerprinted_and_precompressed(self):
+        self.assertRegex(self.url, r'^/static/activities/css/style\.[0-9a-f]{12}\.css$')
+        # Résolution suivante : servie par le cache en mémoire, sans relire le manifeste
+        with mock.patch.object(staticfiles_storage, 'stored_name') as stored_name:
+            self.assertEqual(staticfiles_storage.url('activities/css/style.css'), self.url)
+        stored_name.assert_not_called()
+        hashed_path = staticfiles_storage.path(self.url[len('/static/'):])
+        with open(hashed_path + '.gz', 'rb') as variant:
+            self.assertEqual(gzip.decompress(variant.read()), self.content)
+
+    def test_compressed_variant_is_negotiated(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body, self.content)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get('/static/activities/css/style.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get('/static/staticfiles.json').status_code, 200)
+        self.assertEqual(self.client.get(self.url + '.gz').status_code, 404)
+
+    def test_pages_link_fingerprinted_assets(self):
+        response = self.client.get(reverse('activity_list'))
+        self.assertContains(response, self.url)
+
+
+class HtmlOptimizationTests(ActivityFixturesMixin, TestCase):
+
+    def test_minify_html(self):
+        source = (
+            "<div>\n    <!-- commentaire -->\n    <p>Texte   intact</p>\n\n"
+            "    <!-- {% if x %} -->\n    <pre>  a\n    b</pre>\n</div>\n"
+        )
+        self.assertEqual(
+            minify_html(source),
+            "<div>\n<p>Texte   intact</p>\n<!-- {% if x %} -->\n<pre>  a\n    b</pre>\n</div>\n",
+        )
+
+    def test_pages_are_rendered_without_indentation(self):
+        self.create_activity()
+        response = self.client.get(reverse('activity_list'))
+        self.assertNotIn(b'\n    ', response.content)
+        self.assertNotIn(b'<!-- Bootstrap CSS -->', response.content)
+        self.assertContains(response, 'Sortie en plein air')
+
+    def test_html_is_gzipped(self):
+        self.create_activity()
+        response = self.client.get(reverse('activity_list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'Sortie en plein air', gzip.decompress(response.content))
+
+        response = self.client.get(reverse('activity_list'))
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_brotli_is_never_used_on_pages_with_a_csrf_token(self):
+        fake_brotli = mock.Mock()
+        fake_brotli.compress.side_effect = lambda data, quality: b'br:' + data[:10]
+        self.create_activity()
+        with mock.patch('activities.middleware.brotli', fake_brotli):
+            response = self.client.get(reverse('activity_list'), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+
+            response = self.client.get(reverse('login'), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+
+    def test_partial_responses_are_not_compressed(self):
+        # Fichier compressible sans variante précompressée (collectstatic pas lancé)
+        response = self.client.get('/static/activities/css/style.css',
+                                   HTTP_RANGE='bytes=0-999', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 206)
+        self.assertNotIn('Content-Encoding', response)
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), 1000)
+        with open(staticfiles_storage.path('activities/css/style.css'), 'rb') as original:
+            self.assertEqual(body, original.read(1000))
+
+    def test_streaming_responses_are_compressed(self):
+        self.create_activity()
+        response = self.client.get(reverse('api_activity_list') + '?stream=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(len(data), 1)
+
+
+@override_settings(LOGIN_MAX_FAILURES_PER_ACCOUNT=3, LOGIN_MAX_FAILURES_PER_IP=5, LOGIN_THROTTLE_WINDOW=60)
+class LoginThrottleTests(ActivityFixturesMixin, TestCase):
+
+    def post_login(self, username='organisateur', password='motdepasse123', ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_successful_login_hashes_the_password_once(self):
+        with mock.patch('activities.froms.authenticate', wraps=authenticate) as auth:
+            response = self.post_login()
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(auth.call_count, 1)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_account_is_throttled_without_hashing(self):
+        for _ in range(3):
+            self.post_login(password='mauvais')
+        with self.assertLogs('activities.views', 'WARNING') as logs:
+            with mock.patch('activities.froms.authenticate', wraps=authenticate) as auth:
+                response = self.post_login(ip='10.0.0.2')
+            auth.assert_not_called()
+            self.assertContains(response, "Trop de tentatives")
+            self.assertNotIn('_auth_user_id', self.client.session)
+
+            # La casse du nom ne permet pas de contourner la limite
+            self.assertContains(self.post_login(username='ORGANISATEUR', ip='10.0.0.3'), "Trop de tentatives")
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("Connexion bloquée (trop de tentatives) pour 'organisateur' depuis 10.0.0.2", logs.output[0])
+        self.assertIn("pour 'ORGANISATEUR' depuis 10.0.0.3", logs.output[1])
+
+    def test_ip_is_throttled_across_accounts(self):
+        for index in range(5):
+            self.post_login(username=f'inconnu{index}', password='x')
+        with self.assertLogs('activities.views', 'WARNING') as logs:
+            self.assertContains(self.post_login(), "Trop de tentatives")
+        self.assertEqual(logs.output, [
+            "WARNING:activities.views:Connexion bloquée (trop de tentatives) pour 'organisateur' depuis 10.0.0.1",
+        ])
+        self.assertRedirects(self.post_login(ip='10.0.0.9'), reverse('home'), fetch_redirect_response=False)
+
+    def test_success_resets_account_counter(self):
+        for _ in range(2):
+            self.post_login(password='mauvais')
+        self.post_login()
+        self.client.logout()
+        for _ in range(2):
+            self.post_login(password='mauvais')
+        self.assertRedirects(self.post_login(), reverse('home'), fetch_redirect_response=False)
+
+    def test_failures_are_logged_without_the_password(self):
+        with self.assertLogs('activities.views', level='INFO') as logs:
+            self.post_login(password='secret-a-ne-pas-journaliser')
+        self.assertIn("organisateur", logs.output[0])
+        self.assertNotIn('secret-a-ne-pas-journaliser', ''.join(logs.output))
@@ -1,7 +1,5 @@
-from django.urls import path
-from . import views
-from django.conf import settings
-from django.conf.urls.static import static
+from django.urls import path, re_path
+from . import api, feeds, views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -13,6 +11,16 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),  # URL pour l'inscription
     path('<int:activity_id>/', views.activity_detail, name='activity_detail'),
     path('<int:activity_id>/reserve/', views.reserve_activity, name='reserve_activity'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),  # Compteurs des caches (personnel seulement)
+
+    # API JSON en lecture seule (voir api.py)
+    path('api/v1/activities/', api.activity_list, name='api_activity_list'),
+    path('api/v1/activities/<int:activity_id>/', api.activity_detail, name='api_activity_detail'),
+
+    # Flux d'abonnement .ics / .csv (voir feeds.py)
+    re_path(r'^feeds/(?P<token>[\w-]+)/(?P<scoop>mine|inscrit)\.(?P<fmt>ics|csv)$', feeds.user_feed, name='user_feed'),
+    re_path(r'^feeds/category/(?P<category_id>\d+)\.(?P<fmt>ics|csv)$', feeds.category_feed, name='category_feed'),
+    path('feeds/token/regenerate/', feeds.regenerate_feed_token, name='regenerate_feed_token'),
 
     # URLs de test pour les pages d'erreur (à supprimer en production)
     path('test-404/', views.test_404, name='test_404'),
@@ -20,4 +28,4 @@ urlpatterns = [
     path('test-403/', views.test_403, name='test_403'),
     path('test-500/', views.test_500, name='test_500'),
     path('test-500-real/', views.test_500_real, name='test_500_real'),
-]+ static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+]
\ No newline at end of file
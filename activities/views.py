@@ -1,3 +1,4 @@
+import logging
 import os
 from django.shortcuts import render, Http404, redirect
 from django.contrib.auth import login, authenticate
@@ -5,31 +6,40 @@ from django.contrib.auth.decorators import login_required
 from .froms import LoginForm, RegisterForm, UserEditForm
 from django.utils import timezone
 from django.contrib import messages
-from .models import Activity, User
+from .models import Activity, FeedToken, User
 from .froms import ArticleSearchForm, addNewActivity
-from .services.aqi import get_air_quality
-from django.http import HttpResponseBadRequest
+from .services import login_throttle, reservations
+from .services.aqi import get_air_quality, get_air_quality_badges, describe_aqi, city_key, get_cache_stats
+from .services.fragments import get_fragment_stats
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
 from django.core.files.storage import FileSystemStorage
-from django.core.paginator import Paginator
+from .services.facets import facet_counts, filter_date_range
+from .services.search import search_activities
+from .pagination import paginate_keyset, InvalidCursor, KeysetPage
+from .conditional import compute_etag, conditional_render
+from .page_cache import anonymous_page_cache
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 # Create your views here.
 
 # Fonctions d'aide pour les pages d'erreur personnalisées
-def render_400_error(request, message="Requête invalide"):
+def render_400_error(request, message="Requête invalide", exception=None):
     """Retourne une page d'erreur 400 personnalisée"""
     return render(request, '400.html', {
         'exception': message
     }, status=400)
 
-def render_403_error(request, message="Accès interdit"):
+def render_403_error(request, message="Accès interdit", exception=None):
     """Retourne une page d'erreur 403 personnalisée"""
     return render(request, '403.html', {
         'exception': message
     }, status=403)
 
-def render_404_error(request, message="Page non trouvée"):
+def render_404_error(request, message="Page non trouvée", exception=None):
     """Retourne une page d'erreur 404 personnalisée"""
     return render(request, '404.html', {
         'exception': message
@@ -58,14 +68,31 @@ def custom_login_required(message="Vous devez être connecté pour accéder à c
         return wrapped_view
     return decorator
 
+def attach_aqi_badges(activities):
+    """
+    Ajoute un badge de qualité de l'air (activity.aqi_badge) à chaque activité.
+    Les villes distinctes sont résolues en parallèle avec un délai global :
+    le temps de réponse dépend de la recherche la plus lente, pas du nombre de cartes.
+    """
+    activities = list(activities)
+    badges = get_air_quality_badges({activity.location_city for activity in activities})
+    for activity in activities:
+        activity.aqi_badge = badges.get(city_key(activity.location_city))
+    return activities
+
 #Done
+@anonymous_page_cache
 def index(request):
     # pylint: disable=no-member
-    activities = Activity.objects.filter(
-        start_time__gte=timezone.now()
-    ).select_related('category', 'proposer').order_by('start_time')[:3]
-
-    return render(request, 'activities/home.html', {'activities': activities})
+    activities = attach_aqi_badges(Activity.objects.upcoming().for_cards().order_by('start_time')[:3])
+
+    # Validateur calculé sur les activités affichées : aucune requête supplémentaire
+    etag = compute_etag(request, [(a.pk, a.updated_at, a.attendee_count, a.aqi_badge) for a in activities])
+    last_modified = max((a.updated_at for a in activities), default=None)
+    return conditional_render(
+        request, etag, last_modified,
+        lambda: render(request, 'activities/home.html', {'activities': activities}),
+    )
 
 #Done
 def Login_view(request):
@@ -84,26 +111,21 @@ def Login_view(request):
         messages.info(request, "Vous devez être connecté pour accéder à cette page.")
 
     if request.method == 'POST':
-        form = LoginForm(request.POST)
-
-        # un débug simple pour voir les données reçues
-        print(f"Données POST reçues: {request.POST}")
+        form = LoginForm(request.POST, request=request)
 
         if form.is_valid():
-             # Récupérer les données du formulaire
-            user = form.save()
-
+            # Utilisateur déjà authentifié par form.clean()
+            user = form.get_user()
+            login(request, user)
+            logger.info("Connexion réussie pour l'utilisateur %s", user.username)
+            return redirect('home')
 
-            # Extra debug pour s'Assurer que l'utilisateur existe
-            if user is not None:
-                login(request, user)
-                print(f"Connexion réussie pour l'utilisateur: {user.username}")
-                return redirect('home')
-            else:
-                print("Authentification échouée")
+        username = form.cleaned_data.get('username')
+        if any(error.code == 'throttled' for error in form.non_field_errors().as_data()):
+            logger.warning("Connexion bloquée (trop de tentatives) pour %r depuis %s",
+                           username, login_throttle.client_ip(request))
         else:
-            print(f"Formulaire invalide - Erreurs: {form.errors}")
-            print(f"Non-field errors: {form.non_field_errors()}")
+            logger.info("Connexion refusée pour %r depuis %s", username, login_throttle.client_ip(request))
     else:
         form = LoginForm()
 
@@ -134,7 +156,7 @@ def signup_view(request):
 def activity_detail(request, activity_id):
     # Rechercher l'activité par ID
     # pylint: disable=no-member
-    activity = Activity.objects.filter(id=activity_id).first()
+    activity = Activity.objects.for_cards().filter(id=activity_id).first()
 
     # Vérifier que l'activité existe avant d'aller plus loin
     if activity is None:
@@ -151,43 +173,7 @@ def activity_detail(request, activity_id):
         aqi_value = air_data["data"]["aqi"] if air_data and "data" in air_data and "aqi" in air_data["data"] else None
 
         if aqi_value is not None:
-            # Process the AQI value here
-            if aqi_value <= 50:
-                aqi_description = {
-                    'level': 'Bon',
-                    'color': 'success',
-                    'description': 'Qualité de l\'air excellente, idéale pour les activités extérieures'
-                }
-            elif aqi_value <= 100:
-                aqi_description = {
-                    'level': 'Modéré',
-                    'color': 'warning',
-                    'description': 'Qualité de l\'air acceptable, mais certaines personnes sensibles pourraient ressentir des effets'
-                }
-            elif aqi_value <= 150:
-                aqi_description = {
-                    'level': 'Mauvais pour les sensibles',
-                    'color': 'orange',
-                    'description': 'Les personnes sensibles devraient réduire les activités prolongées à l\'extérieur'
-                }
-            elif aqi_value <= 200:
-                aqi_description = {
-                    'level': 'Mauvais',
-                    'color': 'danger',
-                    'description': 'Tout le monde pourrait commencer à ressentir des effets sur la santé; les personnes sensibles devraient éviter les activités extérieures'
-                }
-            elif aqi_value <= 300:
-                aqi_description = {
-                    'level': 'Très mauvais',
-                    'color': 'dark',
-                    'description': 'Aucune activité extérieure recommandée pour tout le monde'
-                }
-            else:
-                aqi_description = {
-                    'level': 'Dangereux',
-                    'color': 'black',
-                    'description': 'Aucune activité extérieure recommandée pour tout le monde'
-                }
+            aqi_description = describe_aqi(aqi_value)
         else:
             aqi_error_message = "Les données de qualité de l'air ne sont pas disponibles pour cette ville"
             
@@ -217,14 +203,53 @@ def activity_detail(request, activity_id):
         aqi_error_message = "Données de qualité de l'air temporairement indisponibles"
         print(f"[AQI] Erreur inattendue pour {activity.location_city}: {e}")
 
-    # compter le nombre des participants
-    participant_count = activity.attendees.count()
-    for a in activity.attendees.all():
-        print(a.first_name + " " + a.last_name)
+    # Nombre de participants (annoté par for_cards, aucune requête supplémentaire)
+    participant_count = activity.attendee_count
+
+    # Toute modification de l'activité, de ses participants ou de sa liste d'attente met à jour
+    # updated_at ; l'utilisateur connecté fait partie de l'ETag (voir conditional.py)
+    etag = compute_etag(request, activity.updated_at, participant_count, aqi_value, aqi_error_message)
+    return conditional_render(
+        request, etag, activity.updated_at,
+        lambda: render_activity_detail(request, activity, aqi_value, aqi_description, aqi_error_message),
+    )
+
+
+def render_activity_detail(request, activity, aqi_value, aqi_description, aqi_error_message):
+    """Rendu de la page de détail (appelé seulement si la copie du client n'est pas à jour)"""
+    participant_count = activity.attendee_count
+
+    # Vérifier l'inscription de l'utilisateur par une recherche indexée
+    is_attending = (
+        request.user.is_authenticated
+        and activity.attendees.filter(pk=request.user.pk).exists()
+    )
+
+    is_waitlisted = (
+        request.user.is_authenticated
+        and not is_attending
+        and reservations.is_waitlisted(activity, request.user)
+    )
+
+    # Liste des participants : une seule requête, plafonnée et paginée
+    per_page = settings.ATTENDEES_PER_PAGE
+    num_pages = max((participant_count + per_page - 1) // per_page, 1)
+    try:
+        attendees_page = min(max(int(request.GET.get('participants', 1)), 1), num_pages)
+    except ValueError:
+        attendees_page = 1
+    offset = (attendees_page - 1) * per_page
+    attendees = activity.attendees.only('id', 'username').order_by('username', 'id')[offset:offset + per_page]
 
     context = {
         'activity': activity,
         'participant_count': participant_count,
+        'is_attending': is_attending,
+        'is_waitlisted': is_waitlisted,
+        'attendees': attendees,
+        'attendees_page': attendees_page,
+        'attendees_previous_page': attendees_page - 1 if attendees_page > 1 else None,
+        'attendees_next_page': attendees_page + 1 if attendees_page < num_pages else None,
         'air_quality': aqi_value,
         'aqi_description': aqi_description,
         'aqi_error_message': aqi_error_message,
@@ -233,13 +258,12 @@ def activity_detail(request, activity_id):
     return render(request, 'activities/activity_detail.html', context)
 
 #done
+@anonymous_page_cache
 def activity_list(request):
     # Récupérer toutes les activités par défaut
     # pylint: disable=no-member
-    activities = Activity.objects.filter(
-        start_time__gte=timezone.now()
-    )
-    
+    activities = Activity.objects.upcoming()
+
 
     # Créer une instance du formulaire avec les données GET
     form = ArticleSearchForm(request.GET)
@@ -249,12 +273,6 @@ def activity_list(request):
 
     # Vérifier si le formulaire est valide
     if form.is_valid():
-        # Filtrage par catégorie
-        category = form.cleaned_data.get('category')
-
-        if category and category != 'all':
-            activities = activities.filter(category__name=category)
-
         # Filtrage par vue
         if scoop and scoop != 'all':
             if request.user.is_authenticated:
@@ -277,16 +295,87 @@ def activity_list(request):
         # Retourner une page d'erreur 400 personnalisée
         return render_400_error(request, error_message.strip())
 
-    # Ordonner par date de début
-    activities = activities.order_by('start_time')
+    # Filtrage par période
+    filters = form.cleaned_data
+    activities = filter_date_range(activities, filters['when'], filters['date_from'], filters['date_to'])
+    query = filters.get('q', '').strip()
+
+    # Comptes des filtres par catégorie et par ville (avant application de ces deux filtres)
+    facet_base = search_activities(activities, query, ranked=False) if query else activities
+    facets = facet_counts(
+        facet_base,
+        cache_params={
+            'q': query,
+            'when': filters['when'],
+            'date_from': filters['date_from'],
+            'date_to': filters['date_to'],
+            'scoop': scoop if request.user.is_authenticated else None,
+            'user': request.user.pk if scoop in ('mine', 'inscrit') else None,
+        },
+        selected_categories=filters['category'],
+        selected_cities=filters['city'],
+    )
+
+    # Filtrage par catégories et par villes (choix multiples)
+    if filters['category']:
+        activities = activities.filter(category__name__in=filters['category'])
+    if filters['city']:
+        activities = activities.filter(location_city__in=filters['city'])
+    activities = activities.for_cards()
+
+    if query:
+        # Recherche plein texte : résultats triés par pertinence, limités aux meilleurs résultats
+        # (la pagination par curseur suppose un tri par date et n'est pas utilisée ici)
+        page = KeysetPage(list(search_activities(activities, query)[:settings.SEARCH_MAX_RESULTS]))
+    else:
+        # Pagination par curseur sur (start_time, id), triée par date de début
+        try:
+            page = paginate_keyset(
+                activities,
+                settings.ACTIVITIES_PER_PAGE,
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+            )
+        except InvalidCursor as e:
+            return render_400_error(request, str(e))
+
+    # Conserver les filtres dans les liens de pagination
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+
+    def page_url(direction, cursor):
+        if cursor is None:
+            return None
+        page_params = params.copy()
+        page_params[direction] = cursor
+        return f"?{page_params.urlencode()}"
+
+    activities = attach_aqi_badges(page)
+    etag = compute_etag(
+        request,
+        [(a.pk, a.updated_at, a.attendee_count, a.aqi_badge) for a in activities],
+        page.next_cursor, page.previous_cursor, facets,
+    )
+    last_modified = max((a.updated_at for a in activities), default=None)
 
     context = {
         'activities': activities,
+        'page': page,
+        'next_page_url': page_url('after', page.next_cursor),
+        'previous_page_url': page_url('before', page.previous_cursor),
         'form': form,
+        'query': query,
+        'facets': facets,
+        'selected_categories': filters['category'],
+        'selected_cities': filters['city'],
         'scoop': scoop or 'all',  # Passer le paramètre scoop au template
     }
 
-    return render(request, 'activities/activity_list.html', context)
+    return conditional_render(
+        request, etag, last_modified,
+        lambda: render(request, 'activities/activity_list.html', context),
+    )
 
 #Done
 def profile(request, user_id=None):
@@ -310,23 +399,32 @@ def profile(request, user_id=None):
     else:
         utilisateur = request.user
 
-    # Récupérer toutes les activités pour les statistiques
-    all_activities_proposed = Activity.objects.filter(proposer=utilisateur)
-    all_activities_attending = Activity.objects.filter(attendees=utilisateur)
+    # Statistiques calculées en une seule requête agrégée
+    stats = Activity.objects.stats_for(utilisateur)
+
+    # Activités des cartes : catégorie, organisateur et nombre de participants chargés d'avance
+    activities_proposed = Activity.objects.for_cards().filter(proposer=utilisateur).order_by('-start_time')
+    activities_attending = Activity.objects.for_cards().filter(attendees=utilisateur).order_by('-start_time')
 
-    # Récupérer les 2 activités les plus récentes de chaque type
-    recent_activities_proposed = all_activities_proposed.order_by('-start_time')[:2]
-    recent_activities_attending = all_activities_attending.order_by('-start_time')[:2]
+    # Les listes complètes sont plafonnées pour garder un coût constant
+    limit = settings.PROFILE_ACTIVITIES_LIMIT
+    all_activities_proposed = list(activities_proposed[:limit])
+    all_activities_attending = list(activities_attending[:limit])
 
     context = {
-        'activities_proposed': all_activities_proposed,  # Pour les statistiques
-        'activities_attending': all_activities_attending,  # Pour les statistiques
-        'recent_activities_proposed': recent_activities_proposed,  # Pour l'affichage
-        'recent_activities_attending': recent_activities_attending,  # Pour l'affichage
+        'stats': stats,  # Pour les statistiques
+        'activities_proposed': all_activities_proposed,
+        'activities_attending': all_activities_attending,
+        'hidden_proposed_count': max(stats['proposed'] - limit, 0),
+        'hidden_attending_count': max(stats['attending'] - limit, 0),
+        # Les 2 activités les plus récentes de chaque type, sans requête supplémentaire
+        'recent_activities_proposed': all_activities_proposed[:2],  # Pour l'affichage
+        'recent_activities_attending': all_activities_attending[:2],  # Pour l'affichage
         'user': utilisateur,
+        # Adresses des flux de calendrier, visibles seulement par le propriétaire du profil
+        'feed_token': FeedToken.for_user(utilisateur) if utilisateur == request.user else None,
     }
 
-
     return render(request, 'activities/profile.html', context)
 
 #Done
@@ -441,15 +539,21 @@ def reserve_activity(request, activity_id):
         messages.error(request, "Impossible de s'inscrire à une activité passée.")
         return redirect('activity_detail', activity_id=activity_id)
 
-    # Gérer l'inscription/désinscription
-    if request.user in activity.attendees.all():
-        # L'utilisateur est déjà inscrit, le désinscrire
-        activity.attendees.remove(request.user)
-        messages.success(request, f"Vous vous êtes désinscrit de l'activité '{activity.title}'.")
+    # Gérer l'inscription/désinscription (transaction atomique, capacité respectée)
+    if activity.attendees.filter(pk=request.user.pk).exists() or reservations.is_waitlisted(activity, request.user):
+        result, _ = reservations.cancel(activity, request.user)
+        if result == reservations.CANCELLED:
+            messages.success(request, f"Vous vous êtes désinscrit de l'activité '{activity.title}'.")
+        elif result == reservations.LEFT_WAITLIST:
+            messages.success(request, f"Vous avez quitté la liste d'attente de l'activité '{activity.title}'.")
     else:
-        # L'utilisateur n'est pas inscrit, l'inscrire
-        activity.attendees.add(request.user)
-        messages.success(request, f"Vous êtes maintenant inscrit à l'activité '{activity.title}' !")
+        result = reservations.reserve(activity, request.user)
+        if result == reservations.RESERVED:
+            messages.success(request, f"Vous êtes maintenant inscrit à l'activité '{activity.title}' !")
+        elif result == reservations.WAITLISTED:
+            messages.info(request, f"L'activité '{activity.title}' est complète : vous êtes inscrit sur la liste d'attente.")
+        elif result == reservations.ALREADY_WAITLISTED:
+            messages.info(request, f"Vous êtes déjà sur la liste d'attente de l'activité '{activity.title}'.")
 
     return redirect('activity_detail', activity_id=activity_id)
 
@@ -475,3 +579,12 @@ def add_activity(request):
         form = addNewActivity()
 
     return render(request, 'activities/add_activity.html', {'form': form})
+
+
+@staff_member_required
+def cache_stats(request):
+    """Compteurs des caches applicatifs (qualité de l'air, cartes d'activité) pour le réglage des durées"""
+    return JsonResponse({
+        'aqi': get_cache_stats(),
+        'activity_cards': get_fragment_stats(),
+    })
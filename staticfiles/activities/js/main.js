@@ -29,8 +29,37 @@ document.addEventListener('DOMContentLoaded', function () {
             tab.classList.add('active');
         });
     });
+
+    // Pagination de la liste des activités : navigation au clavier et préchargement
+    const pagination = document.querySelector('.activity-pagination');
+    if (pagination) {
+        bindPaginationKeys(pagination);
+        prefetchNextPage(pagination);
+    }
 });
 
+// Navigation au clavier : flèches gauche/droite (aussi sur la dernière page, pour revenir)
+function bindPaginationKeys(pagination) {
+    document.addEventListener('keydown', function (event) {
+        if (event.target.closest('input, textarea, select')) return;
+        if (event.key === 'ArrowRight' && pagination.dataset.nextUrl) {
+            window.location.href = pagination.dataset.nextUrl;
+        } else if (event.key === 'ArrowLeft' && pagination.dataset.previousUrl) {
+            window.location.href = pagination.dataset.previousUrl;
+        }
+    });
+}
+
+// Fonction pour précharger la page suivante (pagination par curseur)
+function prefetchNextPage(pagination) {
+    if (!pagination.dataset.nextUrl) return;
+
+    const link = document.createElement('link');
+    link.rel = 'prefetch';
+    link.href = pagination.dataset.nextUrl;
+    document.head.appendChild(link);
+}
+
 // Fonction pour créer des particules dynamiquement
 function createParticles() {
     const particlesContainer = document.querySelector('.particles');